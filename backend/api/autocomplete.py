@@ -0,0 +1,117 @@
+import json
+import threading
+from bisect import bisect_left
+
+from asgiref.sync import sync_to_async
+
+from recipes.models import Ingredient
+from recipes.services import get_model_version
+
+RANKING_RELEVANCE = 'relevance'
+
+
+class IngredientPrefixIndex:
+    """Per-process prefix index over ingredient names.
+
+    Names are case-folded (so Cyrillic matches regardless of case) and
+    kept in sorted arrays searched with bisect. Each ingredient is stored
+    as a pre-serialized json fragment, so lookups never touch the
+    database. The index is rebuilt lazily when the ingredient version
+    stamp changes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.fragments = ()
+        self.names = ()
+        self.words = ()
+
+    def refresh(self):
+        version = get_model_version(Ingredient)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            self.build(Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'), version)
+
+    async def arefresh(self):
+        """refresh() for async views.
+
+        The lock cannot be held across the query without blocking the
+        event loop, so concurrent refreshes may both load the rows.
+        """
+        version = await sync_to_async(get_model_version)(Ingredient)
+        if version == self.version:
+            return
+        ingredients = [row async for row in Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit')]
+        with self.lock:
+            if version != self.version:
+                self.build(ingredients, version)
+
+    def build(self, ingredients, version):
+        fragments, names, words = [], [], []
+        for position, (pk, name, unit) in enumerate(ingredients):
+            fragments.append(json.dumps(
+                {'id': pk, 'name': name, 'measurement_unit': unit},
+                ensure_ascii=False, separators=(',', ':')))
+            folded = name.casefold()
+            names.append((folded, position))
+            words.extend(
+                (folded[start:], position)
+                for start in range(1, len(folded))
+                if folded[start - 1].isspace()
+                and not folded[start].isspace())
+        self.fragments = tuple(fragments)
+        self.names = tuple(sorted(names))
+        self.words = tuple(sorted(words))
+        self.version = version
+
+    @staticmethod
+    def match(entries, prefix):
+        start = bisect_left(entries, (prefix,))
+        end = bisect_left(entries, (prefix + chr(0x10FFFF),))
+        return entries[start:end]
+
+    def search(self, prefix='', limit=None, ranking=None):
+        """Return the json array of ingredients whose name starts with prefix.
+
+        By default matches keep the catalogue order. With the relevance
+        ranking, exact and shorter names come first, followed by names
+        where a later word starts with the prefix.
+        """
+        self.refresh()
+        return self.find(prefix, limit, ranking)
+
+    async def asearch(self, prefix='', limit=None, ranking=None):
+        await self.arefresh()
+        return self.find(prefix, limit, ranking)
+
+    def find(self, prefix, limit, ranking):
+        fragments = self.fragments
+        prefix = prefix.casefold()
+        if ranking == RANKING_RELEVANCE:
+            matches = sorted(self.match(self.names, prefix),
+                             key=lambda entry: (len(entry[0]), entry[1]))
+            positions = [position for _, position in matches]
+            seen = set(positions)
+            for _, position in sorted(self.match(self.words, prefix),
+                                      key=lambda entry: entry[1]):
+                if position not in seen:
+                    seen.add(position)
+                    positions.append(position)
+        elif prefix:
+            positions = sorted(
+                position for _, position in self.match(self.names, prefix))
+        else:
+            positions = range(len(fragments))
+        if limit is not None:
+            positions = positions[:limit]
+        return '[' + ','.join(fragments[position]
+                              for position in positions) + ']'
+
+
+ingredient_index = IngredientPrefixIndex()
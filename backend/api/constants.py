@@ -29,3 +29,14 @@ AMOUNT_ABOVE_ONE = {
 NOT_NONE_INGREDIENTS = {
     'not_null': 'Значение или ключ не может быть "null"'
 }
+DUPLICATE_INGREDIENTS = 'Ингредиенты не должны повторяться.'
+INVALID_CURSOR = 'Неверный курсор.'
+BATCH_MAX_RECIPES = 100
+
+BATCH_EMPTY = {
+    'errors': 'Передайте id рецептов в "add" или "remove".'
+}
+BATCH_ADD_AND_REMOVE = {
+    'errors': 'Рецепт не может быть одновременно в "add" и "remove".'
+}
+RECIPES_NOT_FOUND = 'Рецепты не найдены: {ids}.'
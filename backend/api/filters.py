@@ -1,11 +1,14 @@
-from rest_framework.filters import SearchFilter
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Recipe
+from recipes.models import Recipe, RecipeTag
+from recipes.search import search_recipes
+from recipes.services import get_tag_ids
 
 
 class RecipeFilterSet(FilterSet):
     tags = filters.CharFilter(method='filter_tags')
+    search = filters.CharFilter(method='filter_search')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
@@ -18,22 +21,23 @@ class RecipeFilterSet(FilterSet):
         user = self.request.user
         if not user.is_authenticated:
             return queryset.none()
-        return queryset.filter(
-            favorite_recipes__user_id=user.pk,
-            favorite_recipes__is_favorited=True)
+        return queryset.filter(is_favorited=recipe_value)
 
     def filter_is_in_shopping_cart(self, queryset, name, recipe_value):
         user = self.request.user
         if not user.is_authenticated:
             return queryset.none()
-        return queryset.filter(
-            shoppingcart_recipes__user_id=user.pk,
-            shoppingcart_recipes__is_in_shopping_cart=True)
+        return queryset.filter(is_in_shopping_cart=recipe_value)
 
     def filter_tags(self, queryset, name, recipe_value):
-        tags = self.request.query_params.getlist('tags')
-        return queryset.filter(tags__slug__in=tags).distinct()
-
-
-class IngredientsFilterSet(SearchFilter):
-    search_param = 'name'
+        tag_ids = get_tag_ids(self.request.query_params.getlist('tags'))
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag__in=tag_ids)))
+
+    def filter_search(self, queryset, name, recipe_value):
+        recipe_value = recipe_value.strip()
+        if not recipe_value:
+            return queryset
+        return search_recipes(queryset, recipe_value)
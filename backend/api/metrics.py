@@ -0,0 +1,95 @@
+import atexit
+import os
+import threading
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+OTHER_ENDPOINT = 'other'
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса.', ('endpoint', 'method'))
+RESPONSES = Counter(
+    'foodgram_http_responses_total',
+    'Ответы по статусам.', ('endpoint', 'method', 'status'))
+RESPONSE_SIZE = Histogram(
+    'foodgram_http_response_size_bytes',
+    'Размер тела ответа (без потоковых ответов).', ('endpoint',),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+DB_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'SQL-запросов за один запрос к API.', ('endpoint',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+DB_DURATION = Histogram(
+    'foodgram_db_duration_seconds',
+    'Время работы БД за один запрос к API.', ('endpoint',))
+DB_CONNECT_DURATION = Histogram(
+    'foodgram_db_connect_duration_seconds',
+    'Время открытия нового соединения с БД.', ('database',),
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+DB_CONNECTIONS_OPEN = Gauge(
+    'foodgram_db_connections_open',
+    'Открытые соединения с БД.', ('database',),
+    multiprocess_mode='livesum')
+DB_BUSY = Counter(
+    'foodgram_db_busy_seconds',
+    'Время, которое соединения с БД заняты выполнением запросов.',
+    ('database',))
+DB_HEALTH_CHECK_FAILURES = Counter(
+    'foodgram_db_health_check_failures_total',
+    'Соединения, закрытые после неудачной проверки перед запросом.',
+    ('database',))
+
+
+@atexit.register
+def mark_process_dead():
+    """Drop the live gauges of this process when it exits.
+
+    gunicorn does it for its workers in child_exit; other processes run
+    with PROMETHEUS_MULTIPROC_DIR (e.g. manage.py commands) would
+    otherwise leave their open connections counted for good.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class EndpointLabels:
+    """Cap the number of distinct endpoint label values per process.
+
+    Endpoints come from resolved routes, so the set is small, but a
+    bug must not be able to blow up the metrics store: past the limit
+    new names are reported as "other".
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, endpoint):
+        if endpoint in self.seen:
+            return endpoint
+        with self.lock:
+            if len(self.seen) >= self.limit:
+                return OTHER_ENDPOINT
+            self.seen.add(endpoint)
+        return endpoint
+
+
+def get_registry():
+    """Registry with the metrics of every gunicorn worker.
+
+    With PROMETHEUS_MULTIPROC_DIR set each worker writes its values to
+    mmap-ed files in that directory and they are merged on scrape.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics():
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
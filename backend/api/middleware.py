@@ -0,0 +1,247 @@
+import abc
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from api import metrics
+
+logger = logging.getLogger('api.sql')
+
+FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+TOP_SHAPES = 5
+UNMATCHED_ENDPOINT = 'unmatched'
+HTTP_METHODS = frozenset(
+    ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {
+    'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0,
+    'n_plus_one_requests': 0, 'repeated_shapes': Counter()})
+
+
+def get_endpoint(request):
+    """Name the endpoint after the route and the viewset action.
+
+    Viewset routes give basename.action, for example
+    recipes.download_shopping_cart; other views give their url name.
+    """
+    match = request.resolver_match
+    if match is None:
+        return UNMATCHED_ENDPOINT
+    method = 'get' if request.method == 'HEAD' else request.method.lower()
+    action = getattr(match.func, 'actions', {}).get(method)
+    basename = getattr(match.func, 'initkwargs', {}).get('basename')
+    if basename and action:
+        return f'{basename}.{action}'
+    return match.url_name or match.view_name
+
+
+def count_queries(recorder):
+    """Run the wrapped code with recorder watching every SQL query."""
+    return connection.execute_wrapper(recorder)
+
+
+@asynccontextmanager
+async def acount_queries(recorder):
+    """count_queries for async requests.
+
+    The ORM of an async view runs in the sync thread of the request, so
+    the wrapper is installed on that thread's connection.
+    """
+    wrapper = await sync_to_async(count_queries)(recorder)
+    await sync_to_async(wrapper.__enter__)()
+    try:
+        yield
+    finally:
+        await sync_to_async(wrapper.__exit__)(None, None, None)
+
+
+def fingerprint(sql):
+    """SQL with literals and parameters masked: the shape of the query."""
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def get_sql_stats():
+    """Per-endpoint totals of this process since it started."""
+    with _stats_lock:
+        return {
+            endpoint: {
+                'requests': stats['requests'],
+                'queries_avg': round(stats['queries'] / stats['requests'], 2),
+                'queries_max': stats['max_queries'],
+                'db_ms_avg': round(stats['db_ms'] / stats['requests'], 3),
+                'n_plus_one_requests': stats['n_plus_one_requests'],
+                'repeated_shapes': [
+                    {'sql': shape, 'requests': count}
+                    for shape, count in
+                    stats['repeated_shapes'].most_common(TOP_SHAPES)],
+            }
+            for endpoint, stats in sorted(_stats.items())
+        }
+
+
+class QueryRecorder:
+    def __init__(self, shapes=True):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter() if shapes else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            if self.shapes is not None:
+                self.shapes[fingerprint(sql)] += 1
+
+    def repeated(self, threshold):
+        return {shape: count for shape, count in self.shapes.items()
+                if count >= threshold}
+
+
+class InstrumentationMiddleware(abc.ABC):
+    """Time every request and record its SQL, under WSGI and ASGI.
+
+    Subclasses report the finished request in record_request().
+    """
+    sync_capable = True
+    async_capable = True
+    record_shapes = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder(shapes=self.record_shapes)
+        started = time.perf_counter()
+        with count_queries(recorder):
+            response = self.get_response(request)
+        self.record_request(request, response, recorder,
+                            time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(shapes=self.record_shapes)
+        started = time.perf_counter()
+        async with acount_queries(recorder):
+            response = await self.get_response(request)
+        self.record_request(request, response, recorder,
+                            time.perf_counter() - started)
+        return response
+
+    @abc.abstractmethod
+    def record_request(self, request, response, recorder, duration):
+        """Report the request, timed at duration seconds."""
+
+
+class SQLInstrumentationMiddleware(InstrumentationMiddleware):
+    """Record the SQL of every request; flag likely N+1 patterns.
+
+    Enabled with SQL_INSTRUMENTATION. Each response gets a Server-Timing
+    header with the query count and DB time, every request is logged as
+    a json line to the api.sql logger, and query shapes repeated at
+    least SQL_REPEATED_QUERY_THRESHOLD times within one request (same
+    SQL, different parameters) are reported as a likely N+1 for the
+    view and action. Queries run while a streaming body is consumed
+    are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.threshold = settings.SQL_REPEATED_QUERY_THRESHOLD
+
+    def record_request(self, request, response, recorder, total):
+        endpoint = get_endpoint(request)
+        repeated = recorder.repeated(self.threshold)
+        self.record(endpoint, recorder, repeated)
+        timings = [
+            f'db;dur={recorder.duration * 1000:.2f};'
+            f'desc="{recorder.count} queries"',
+            f'app;dur={total * 1000:.2f}',
+        ]
+        if repeated:
+            timings.append(f'n-plus-one;desc="{len(repeated)} repeated '
+                           f'query shapes"')
+        response['Server-Timing'] = ', '.join(timings)
+        entry = {
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+        }
+        if repeated:
+            entry['repeated'] = [{'sql': shape, 'count': count}
+                                 for shape, count in repeated.items()]
+            logger.warning(json.dumps(entry, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(entry, ensure_ascii=False))
+
+    @staticmethod
+    def record(endpoint, recorder, repeated):
+        with _stats_lock:
+            stats = _stats[endpoint]
+            stats['requests'] += 1
+            stats['queries'] += recorder.count
+            stats['max_queries'] = max(stats['max_queries'], recorder.count)
+            stats['db_ms'] += recorder.duration * 1000
+            if repeated:
+                stats['n_plus_one_requests'] += 1
+                stats['repeated_shapes'].update(repeated.keys())
+
+
+class MetricsMiddleware(InstrumentationMiddleware):
+    """Feed the Prometheus metrics of /api/_metrics.
+
+    Records latency, status and response size per endpoint and method,
+    and the number and time of SQL queries per endpoint. Disabled with
+    METRICS_ENABLED.
+    """
+    record_shapes = False
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.labels = metrics.EndpointLabels(settings.METRICS_MAX_ENDPOINTS)
+
+    def record_request(self, request, response, recorder, duration):
+        endpoint = self.labels(get_endpoint(request))
+        method = (request.method if request.method in HTTP_METHODS
+                  else metrics.OTHER_ENDPOINT)
+        metrics.REQUEST_LATENCY.labels(endpoint, method).observe(duration)
+        metrics.RESPONSES.labels(
+            endpoint, method, response.status_code).inc()
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.labels(endpoint).observe(
+                len(response.content))
+        metrics.DB_QUERIES.labels(endpoint).observe(recorder.count)
+        metrics.DB_DURATION.labels(endpoint).observe(recorder.duration)
@@ -0,0 +1,288 @@
+import functools
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags
+from rest_framework.authentication import (TokenAuthentication,
+                                           get_authorization_header)
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+
+from recipes.services import get_model_versions, get_user_version
+
+CACHE_STATS = ('hits', 'misses')
+
+
+def increment_cache_stat(stat):
+    key = f'stats:response_cache:{stat}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_cache_stats():
+    stats = cache.get_many(
+        [f'stats:response_cache:{stat}' for stat in CACHE_STATS])
+    return {stat: stats.get(f'stats:response_cache:{stat}', 0)
+            for stat in CACHE_STATS}
+
+
+class ConditionalCacheMixin:
+    """Conditional GET and cached bodies for list and retrieve.
+
+    Responses are keyed by the version stamps of cache_models, which the
+    recipes signals bump on every change, and by the normalized query
+    params. With cache_per_user the user and their own stamp (favorites,
+    cart, follows) are part of the key too, while anonymous responses
+    are shared. A matching If-None-Match is answered with 304 and a known
+    body is served from the cache.
+    """
+    cache_models = ()
+    cache_per_user = False
+    cache_timeout = None
+
+    def perform_authentication(self, request):
+        """Skip authentication of requests that carry no credentials.
+
+        Anonymous requests authenticate lazily, only if the view needs
+        the user. A request with an Authorization header is checked at
+        once, so a bad token still gets its 401 on public endpoints.
+        """
+        if get_authorization_header(request):
+            request.user
+
+    def get_cache_versions(self, request):
+        versions = get_model_versions(self.cache_models)
+        if self.cache_per_user and request.user.is_authenticated:
+            versions.append(get_user_version(request.user))
+        return versions
+
+    def get_cache_key(self, request, versions):
+        user = 'anonymous'
+        if self.cache_per_user and request.user.is_authenticated:
+            user = request.user.pk
+        query = sorted((param, sorted(set(values)))
+                       for param, values in request.query_params.lists())
+        key = ':'.join(map(str, (
+            *versions, user, request.accepted_renderer.format,
+            request.build_absolute_uri(request.path), query)))
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def is_not_modified(self, request, etag, cache_key):
+        """Match If-None-Match against the ETag of the response.
+
+        "*" matches any current representation, so it is honoured only
+        when a cached 200 body shows that the resource exists.
+        If-Modified-Since is not: Last-Modified has whole seconds, while
+        two writes within one second get different stamps and ETags.
+        """
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is None:
+            return False
+        etags = parse_etags(if_none_match)
+        if etag in etags:
+            return True
+        return '*' in etags and cache.has_key(f'response:{cache_key}')
+
+    def get_validators(self, request, versions):
+        """Return the cache key, ETag and Last-Modified of a response."""
+        cache_key = self.get_cache_key(request, versions)
+        return cache_key, f'"{cache_key}"', max(versions, default=0) // 10 ** 9
+
+    def set_validators(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response.headers['ETag'] = etag
+            response.headers['Last-Modified'] = http_date(last_modified)
+        if self.cache_per_user:
+            response.headers['Vary'] = 'Authorization'
+        return response
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        cache_key, etag, last_modified = self.get_validators(
+            request, self.get_cache_versions(request))
+        if self.is_not_modified(request, etag, cache_key):
+            response = HttpResponseNotModified()
+        else:
+            response = self.get_cached_response(cache_key)
+            if response is None:
+                response = self.store_response(
+                    handler(request, *args, **kwargs), cache_key)
+        return self.set_validators(response, etag, last_modified)
+
+    async def aconditional_response(self, handler, request, *args,
+                                    **kwargs):
+        """conditional_response for an async handler."""
+        if request.accepted_renderer.format != 'json':
+            return await handler(request, *args, **kwargs)
+        cache_key, etag, last_modified = self.get_validators(
+            request, await sync_to_async(self.get_cache_versions)(request))
+        if self.is_not_modified(request, etag, cache_key):
+            response = HttpResponseNotModified()
+        else:
+            response = self.get_cached_response(cache_key)
+            if response is None:
+                response = self.store_response(
+                    await handler(request, *args, **kwargs), cache_key)
+        return self.set_validators(response, etag, last_modified)
+
+    def get_cached_response(self, cache_key):
+        cached = cache.get(f'response:{cache_key}')
+        if cached is None:
+            increment_cache_stat('misses')
+            return None
+        increment_cache_stat('hits')
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    def store_response(self, response, cache_key):
+        """Cache the body of a successful response once it is rendered."""
+        response.headers['X-Cache'] = 'MISS'
+
+        def store(response):
+            if response.status_code == 200:
+                cache.set(f'response:{cache_key}',
+                          (response.content, response['Content-Type']),
+                          timeout=self.cache_timeout)
+
+        if isinstance(response, Response):
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aconditional_response(
+            super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aconditional_response(
+            super().aretrieve, request, *args, **kwargs)
+
+
+async def authenticate(request):
+    """Token user of the request without leaving the event loop.
+
+    Mirrors TokenAuthentication: no token gives AnonymousUser, a token
+    that is malformed, unknown or belongs to an inactive user gives
+    None, and the sync view then answers with its usual 401.
+    """
+    header = get_authorization_header(request).split()
+    if (not header or header[0].lower()
+            != TokenAuthentication.keyword.lower().encode()):
+        return AnonymousUser()
+    if len(header) != 2:
+        return None
+    try:
+        key = header[1].decode()
+    except UnicodeError:
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(key=key)
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+def async_read_view(view, handler_name):
+    """Serve GET and HEAD of a viewset route with an async handler.
+
+    Repeats what APIView.dispatch() does around the handler. Every other
+    method, unauthenticated token and non-json format goes to the sync
+    view in the thread of the request, so writes keep their transactions
+    and errors look the same.
+    """
+    sync_view = sync_to_async(view)
+    actions = dict(view.actions)
+    actions.setdefault('head', actions['get'])
+
+    async def async_view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await sync_view(request, *args, **kwargs)
+        user = await authenticate(request)
+        if user is None:
+            return await sync_view(request, *args, **kwargs)
+        self = view.cls(**view.initkwargs)
+        self.action_map = actions
+        for method, action in actions.items():
+            setattr(self, method, getattr(self, action))
+        self.args, self.kwargs = args, kwargs
+        drf_request = self.initialize_request(request, *args, **kwargs)
+        drf_request.user = user
+        self.request = drf_request
+        self.headers = self.default_response_headers
+        try:
+            self.initial(drf_request, *args, **kwargs)
+            if drf_request.accepted_renderer.format != 'json':
+                return await sync_view(request, *args, **kwargs)
+            response = await getattr(self, handler_name)(
+                drf_request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(
+            drf_request, response, *args, **kwargs)
+        return self.response
+
+    return functools.update_wrapper(async_view, view)
+
+
+class AsyncReadMixin:
+    """Async list and retrieve for ASGI deployments.
+
+    With ASYNC_VIEWS on, as_view() routes GET of the actions that have
+    an async twin (alist, aretrieve, ...) through async_read_view().
+    django-filter and the paginator have no async API, so filtering and
+    the page query run in the sync thread of the request.
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        handler_name = f'a{actions.get("get")}'
+        if not settings.ASYNC_VIEWS or not hasattr(cls, handler_name):
+            return view
+        return async_read_view(view, handler_name)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset())
+        page = await sync_to_async(self.paginate_queryset)(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(
+            [instance async for instance in queryset], many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches '
+                          f'the given query.')
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(request, instance)
+        return Response(self.get_serializer(instance).data)
@@ -1,6 +1,124 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.constants import INVALID_CURSOR
 
 
 class FoodgramPageNumberPagination(PageNumberPagination):
+    """Page numbers by default, keyset pages on request.
+
+    Views that declare cursor_ordering, e.g. ('-created_at', '-id'),
+    switch to keyset pagination with ?pagination=cursor or ?cursor=.
+    Keyset pages filter on the last seen key instead of using OFFSET,
+    skip the COUNT query and return opaque next/previous cursors.
+    """
     page_size_query_param = 'limit'
     max_page_size = 100
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_ordering = getattr(view, 'cursor_ordering', None)
+        self.use_cursor = bool(self.cursor_ordering) and (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor')
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_keyset(queryset, request)
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def paginate_keyset(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        key, reverse = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param))
+        ordering = self.cursor_ordering
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith('-')
+                             else f'-{field}' for field in ordering)
+        if key is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(ordering, key))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(INVALID_CURSOR)
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        self.next_key = self.previous_key = None
+        if rows and (has_more if not reverse else key is not None):
+            self.next_key = self.get_key(rows[-1])
+        if rows and (has_more if reverse else key is not None):
+            self.previous_key = self.get_key(rows[0])
+        return rows
+
+    @staticmethod
+    def get_keyset_filter(ordering, key):
+        """Rows after key: (a > x) or (a = x and b > y) and so on."""
+        keyset_filter = Q()
+        equal = Q()
+        for field, value in zip(ordering, key):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            keyset_filter |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return keyset_filter
+
+    def get_key(self, row):
+        key = [getattr(row, field.lstrip('-'))
+               for field in self.cursor_ordering]
+        return [value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in key]
+
+    def encode_cursor(self, key, reverse):
+        cursor = json.dumps({'k': key, 'r': reverse})
+        return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            key, reverse = cursor['k'], bool(cursor['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(INVALID_CURSOR)
+        if not isinstance(key, list) or len(key) != len(
+                self.cursor_ordering):
+            raise NotFound(INVALID_CURSOR)
+        return key, reverse
+
+    def get_cursor_link(self, key, reverse):
+        if key is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(key, reverse))
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        return self.get_cursor_link(self.next_key, False)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        return self.get_cursor_link(self.previous_key, True)
@@ -0,0 +1,84 @@
+import math
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'),
+                   (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer on orjson with byte for byte the same output.
+
+    Types orjson does not write the way DRF does (Decimal, lazy strings,
+    datetimes with the Z suffix) go through DRF's encoder. Indented
+    output, non-default UNICODE_JSON, COMPACT_JSON or STRICT_JSON, a
+    missing orjson and data orjson refuses (integers beyond 64 bits) fall
+    back to the stdlib renderer, as does NaN or infinity, which orjson
+    would write as null where the stdlib raises ValueError.
+    """
+    encoder = JSONEncoder()
+    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+               if orjson else 0)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or not self.strict
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        if data is None:
+            return b''
+        try:
+            rendered = orjson.dumps(data, default=self.encoder.default,
+                                    option=self.options)
+        except (TypeError, orjson.JSONEncodeError):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        if b'null' in rendered and not is_finite(data):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in rendered:
+                rendered = rendered.replace(separator, escaped)
+        return rendered
+
+
+def is_finite(data):
+    """Whether data holds no NaN or infinite float."""
+    if isinstance(data, float):
+        return math.isfinite(data)
+    if isinstance(data, dict):
+        return (all(map(is_finite, data))
+                and all(map(is_finite, data.values())))
+    if isinstance(data, (list, tuple)):
+        return all(map(is_finite, data))
+    return True
+
+
+class ShoppingCartBaseRenderer(BaseRenderer):
+    """Negotiate the shopping cart export format.
+
+    The export itself is streamed by recipes.services, so only plain
+    messages (e.g. an empty cart) are rendered here.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return '\n'.join(str(message) for message in data.values())
+
+
+class ShoppingCartCSVRenderer(ShoppingCartBaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class ShoppingCartTextRenderer(ShoppingCartBaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
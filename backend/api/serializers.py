@@ -7,12 +7,14 @@ from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 from rest_framework.serializers import CurrentUserDefault
 
-from api.constants import (ALREADY_IN_SHOPPING_CART, NOT_IN_SHOPPING_CART,
-                           NOT_IN_FAVORED, ALREADY_IN_FAVORITED,
-                           AMOUNT_ABOVE_ONE, NOT_NONE_INGREDIENTS,
-                           CANNOT_FOLLOW_YOURSELF, ALREADY_FOLLOWS)
-from recipes.models import (Ingredient, Tag, Recipe,
-                            IngredientRecipe, Favorite, ShoppingCart)
+from api.constants import (AMOUNT_ABOVE_ONE, NOT_NONE_INGREDIENTS,
+                           CANNOT_FOLLOW_YOURSELF, ALREADY_FOLLOWS,
+                           BATCH_MAX_RECIPES, BATCH_EMPTY,
+                           BATCH_ADD_AND_REMOVE, RECIPES_NOT_FOUND,
+                           DUPLICATE_INGREDIENTS)
+from recipes.models import Ingredient, Tag, Recipe, IngredientRecipe
+from recipes.renditions import get_rendition
+from recipes.services import sync_recipe_ingredients
 
 User = get_user_model()
 
@@ -28,6 +30,14 @@ class Base64ImageField(serializers.ImageField):
 
         return super().to_internal_value(image_data)
 
+    def to_representation(self, image):
+        request = self.context.get('request')
+        if request is not None:
+            image = get_rendition(
+                image, request.query_params.get('image_size'),
+                request.query_params.get('image_format'))
+        return super().to_representation(image)
+
 
 class ProfileSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
@@ -39,15 +49,26 @@ class ProfileSerializer(serializers.ModelSerializer):
                   'is_subscribed', 'avatar')
 
     def get_is_subscribed(self, another_user):
+        is_subscribed = getattr(another_user, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get('request')
         if not request.user.is_authenticated:
             return False
         return request.user.follows.filter(following=another_user.id).exists()
 
 
+class RecipeMinifiedSerializer(serializers.ModelSerializer):
+    image = Base64ImageField(read_only=True)
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'name', 'image', 'cooking_time')
+
+
 class FollowSerializer(ProfileSerializer):
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes = RecipeMinifiedSerializer(source='latest_recipes', many=True,
+                                       read_only=True)
 
     class Meta(ProfileSerializer.Meta):
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
@@ -67,28 +88,13 @@ class FollowSerializer(ProfileSerializer):
             raise serializers.ValidationError(ALREADY_FOLLOWS)
         return follower_data
 
-    def get_recipes(self, another_user):
-        return another_user.recipes.all()
-
-    def get_recipes_count(self, another_user):
-        return another_user.recipes.count()
-
     def to_representation(self, instance):
         request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit', None)
         if request.method == 'POST':
-            instance = get_object_or_404(User, pk=self.follower_id())
-        data = super().to_representation(instance)
-        recipes = [
-            {'id': recipe.id, 'name': recipe.name,
-             'image': request.build_absolute_uri(recipe.image.url),
-             'cooking_time': recipe.cooking_time}
-            for recipe in instance.recipes.all()
-        ]
-        if recipes_limit is not None:
-            recipes = recipes[:int(recipes_limit)]
-        data['recipes'] = recipes
-        return data
+            instance = get_object_or_404(
+                self.context.get('view').get_subscriptions_queryset(),
+                pk=self.follower_id())
+        return super().to_representation(instance)
 
 
 class IngredientsSerializer(serializers.ModelSerializer):
@@ -97,6 +103,17 @@ class IngredientsSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class IngredientAmountSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+
+    class Meta:
+        model = IngredientRecipe
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class TagsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -107,9 +124,10 @@ class RecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=True, allow_null=False)
     author = ProfileSerializer(read_only=True)
     tags = TagsSerializer(many=True)
-    ingredients = IngredientsSerializer(many=True)
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    ingredients = IngredientAmountSerializer(source='recipe_ingredients',
+                                             many=True)
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
     cooking_time = serializers.IntegerField(required=True, min_value=1)
 
     class Meta:
@@ -124,32 +142,6 @@ class RecipeSerializer(serializers.ModelSerializer):
     def get_user(self):
         return self.get_request().user
 
-    def get_is_favorited(self, recipe_data):
-        user = self.get_user()
-        if not user.is_authenticated:
-            return False
-        return recipe_data.favorite_recipes.filter(
-            is_favorited=True, user=self.get_user()
-        ).exists()
-
-    def get_is_in_shopping_cart(self, recipe_data):
-        user = self.get_user()
-        if not user.is_authenticated:
-            return False
-        return recipe_data.shoppingcart_recipes.filter(
-            is_in_shopping_cart=True, user=self.get_user()
-        ).exists()
-
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        ingredients = data.get('ingredients')
-        ingredient_amounts = {ir.ingredient.id: ir.amount for
-                              ir in instance.recipe_ingredients.all()}
-        for ingredient in ingredients:
-            ingredient_id = ingredient.get('id')
-            ingredient['amount'] = ingredient_amounts.get(ingredient_id)
-        return data
-
 
 class IngredientRecipeSerializer(serializers.Serializer):
     id = serializers.PrimaryKeyRelatedField(
@@ -177,20 +169,23 @@ class RecipePostPatchSerializer(RecipeSerializer):
     class Meta(RecipeSerializer.Meta):
         pass
 
+    RECIPE_FIELDS = ('image', 'name', 'text', 'cooking_time')
+
+    def validate_ingredients(self, ingredients):
+        ingredient_ids = [ingredient['id'].pk for ingredient in ingredients]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise ValidationError(DUPLICATE_INGREDIENTS)
+        return ingredients
+
     def create_or_update_ingredients_tags(
             self, recipe, tags=None, ingredients=None):
-        recipe.tags.set(tags)
-        ingredients_data = []
-        recipe.recipe_ingredients.all().delete()
-        for ingredient in ingredients:
-            ingredient_id = ingredient.get('id')
-            amount = ingredient.get('amount')
-            recipe_ingredient = IngredientRecipe(
-                ingredient=ingredient_id, recipe=recipe, amount=amount
-            )
-            ingredients_data.append(recipe_ingredient)
-        IngredientRecipe.objects.bulk_create(ingredients_data)
-
+        """Write the supplied tags and ingredients; skip omitted ones."""
+        if tags is not None:
+            recipe.tags.set(tags)
+        if ingredients is not None:
+            sync_recipe_ingredients(recipe, {
+                ingredient['id'].pk: ingredient['amount']
+                for ingredient in ingredients})
         return recipe
 
     def create(self, validated_data):
@@ -201,91 +196,43 @@ class RecipePostPatchSerializer(RecipeSerializer):
             recipe, tags, ingredients)
 
     def update(self, instance, validated_data):
-        tags = validated_data.get('tags')
-        ingredients = validated_data.get('ingredients')
-        instance.image = validated_data.get('image', instance.image)
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get('cooking_time',
-                                                   instance.cooking_time)
-        instance.save()
+        changed_fields = []
+        for field in self.RECIPE_FIELDS:
+            if (field in validated_data
+                    and getattr(instance, field) != validated_data[field]):
+                setattr(instance, field, validated_data[field])
+                changed_fields.append(field)
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
         return self.create_or_update_ingredients_tags(
-            instance, tags=tags, ingredients=ingredients)
+            instance, tags=validated_data.get('tags'),
+            ingredients=validated_data.get('ingredients'))
 
     def to_representation(self, instance):
+        instance = Recipe.objects.for_representation(
+            self.get_user()).get(pk=instance.pk)
         return RecipeSerializer(instance, context=self.context).data
 
 
-class FavoriteShoppingCartBaseSerializer(serializers.ModelSerializer):
-    class Meta:
-        fields = ('id',)
-        abstract = True
-
-    def get_request(self):
-        return self.context.get('request')
-
-    def get_user(self):
-        return self.get_request().user
-
-    def get_recipe(self):
-        pk = self.get_request().parser_context.get('kwargs').get('pk')
-        return get_object_or_404(Recipe, pk=pk)
-
-    def to_representation(self, instance):
-        return RepresentRecipeSerializer(
-            instance, context=self.context
-        ).data
-
-
-class RepresentRecipeSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
-
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        recipe_pk = request.parser_context.get('kwargs').get('pk')
-        recipe = get_object_or_404(Recipe, pk=recipe_pk)
-        recipe_data = super().to_representation(recipe)
-        return recipe_data
-
-
-class ShoppingCartSerializer(FavoriteShoppingCartBaseSerializer):
-    class Meta(FavoriteShoppingCartBaseSerializer.Meta):
-        model = ShoppingCart
-
-    def validate(self, shopping_cart_data):
-        recipe = self.get_recipe()
-        request = self.get_request()
-        user = self.get_user()
-        query = ShoppingCart.objects.filter(
-            recipe=recipe, user=user,
-            is_in_shopping_cart=True).exists()
-        if request.method == 'POST':
-            if query:
-                raise ValidationError(ALREADY_IN_SHOPPING_CART)
-
-        if request.method == 'DELETE':
-            if not query:
-                raise ValidationError(NOT_IN_SHOPPING_CART)
-        return shopping_cart_data
-
-
-class FavoriteSerializer(FavoriteShoppingCartBaseSerializer):
-    class Meta(FavoriteShoppingCartBaseSerializer.Meta):
-        model = Favorite
-
-    def validate(self, favorite_data):
-        recipe = self.get_recipe()
-        request = self.get_request()
-        user = self.get_user()
-        query = Favorite.objects.filter(
-            recipe=recipe, user=user, is_favorited=True).exists()
-        if request.method == 'POST':
-            if query:
-                raise ValidationError(ALREADY_IN_FAVORITED)
-
-        elif request.method == 'DELETE':
-            if not query:
-                raise ValidationError(NOT_IN_FAVORED)
-        return favorite_data
+class UserListBatchSerializer(serializers.Serializer):
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False,
+        max_length=BATCH_MAX_RECIPES)
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False,
+        max_length=BATCH_MAX_RECIPES)
+
+    def validate(self, batch_data):
+        add = set(batch_data.setdefault('add', []))
+        remove = set(batch_data.setdefault('remove', []))
+        if not add and not remove:
+            raise ValidationError(BATCH_EMPTY)
+        if add & remove:
+            raise ValidationError(BATCH_ADD_AND_REMOVE)
+        missing = (add | remove) - set(Recipe.objects.filter(
+            pk__in=add | remove).values_list('pk', flat=True))
+        if missing:
+            raise ValidationError({
+                'recipes': RECIPES_NOT_FOUND.format(
+                    ids=', '.join(map(str, sorted(missing))))})
+        return batch_data
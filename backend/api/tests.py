@@ -0,0 +1,739 @@
+import base64
+import importlib.util
+import json
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import ModuleType
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import include, path
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from api.mixins import ConditionalCacheMixin
+from api.renderers import FastJSONRenderer, orjson
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Follows
+
+User = get_user_model()
+
+RECIPES = 12
+LOCAL_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'tests'},
+}
+
+
+def encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def get_async_urlconf():
+    """URLconf of the API built with ASYNC_VIEWS on."""
+    with override_settings(ASYNC_VIEWS=True):
+        spec = importlib.util.find_spec('api.urls')
+        api_urls = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(api_urls)
+    urlconf = ModuleType('async_urls')
+    urlconf.urlpatterns = [path('api/', include(api_urls, namespace='api'))]
+    return urlconf
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RecipeQueryCountTests(TestCase):
+    """The recipe list and detail cost the same queries at any size."""
+
+    # The version stamps, the token lookup with the user, then the
+    # recipe page (count and rows) or the recipe, then the prefetches of
+    # authors, tags and ingredients.
+    LIST_QUERIES = 6
+    DETAIL_QUERIES = 5
+    AUTHENTICATION_QUERIES = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@foodgram.local',
+            first_name='Читатель', last_name='Читатель', password='x')
+        cls.token = Token.objects.create(user=cls.user).key
+        authors = [User.objects.create_user(
+            username=f'author{number}', email=f'author{number}@foodgram.local',
+            first_name='Автор', last_name=str(number), password='x')
+            for number in range(3)]
+        Follows.objects.create(user=cls.user, following=authors[0])
+        tags = [Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+                for number in range(3)]
+        ingredients = [Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(5)]
+        for number in range(RECIPES):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}', text='Текст.',
+                image='recipes/test.png', cooking_time=10)
+            recipe.tags.set(tags[:number % len(tags) + 1])
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=number + 1)
+                for ingredient in ingredients[:number % 4 + 2])
+            if number % 2:
+                Favorite.objects.create(
+                    user=cls.user, recipe=recipe, is_favorited=True)
+            if number % 3:
+                ShoppingCart.objects.create(
+                    user=cls.user, recipe=recipe, is_in_shopping_cart=True)
+        cls.recipe = Recipe.objects.latest('created_at')
+
+    def setUp(self):
+        # Rendered bodies are cached; every request has to be built.
+        cache.clear()
+
+    def authorize(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+
+    def assert_list_queries(self, queries):
+        for limit in (2, RECIPES):
+            cache.clear()
+            with self.subTest(limit=limit), self.assertNumQueries(queries):
+                response = self.client.get(f'/api/recipes/?limit={limit}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), limit)
+
+    def assert_detail_queries(self, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_anonymous(self):
+        self.assert_list_queries(self.LIST_QUERIES)
+
+    def test_list_authenticated(self):
+        self.authorize()
+        self.assert_list_queries(
+            self.LIST_QUERIES + self.AUTHENTICATION_QUERIES)
+
+    def test_detail_anonymous(self):
+        self.assert_detail_queries(self.DETAIL_QUERIES)
+
+    def test_detail_authenticated(self):
+        self.authorize()
+        self.assert_detail_queries(
+            self.DETAIL_QUERIES + self.AUTHENTICATION_QUERIES)
+
+    def test_cached_response(self):
+        self.authorize()
+        self.client.get(f'/api/recipes/?limit={RECIPES}')
+        with self.assertNumQueries(1 + self.AUTHENTICATION_QUERIES):
+            response = self.client.get(f'/api/recipes/?limit={RECIPES}')
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+
+    def test_own_lists_change_etag(self):
+        self.authorize()
+        recipe = Recipe.objects.exclude(
+            favorite_recipes__user=self.user).first()
+        url = f'/api/recipes/{recipe.pk}/'
+        etag = self.client.get(url).headers['ETag']
+        self.client.post(f'{url}favorite/')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_counters_do_not_go_below_zero(self):
+        # Rows created before the counters existed start at zero.
+        Recipe.objects.update(favorites_count=0, in_carts_count=0)
+        User.objects.update(followers_count=0)
+        self.authorize()
+        favorite = Favorite.objects.filter(user=self.user).first()
+        cart = ShoppingCart.objects.filter(user=self.user).first()
+        following = Follows.objects.get(user=self.user).following
+        for url in (f'/api/recipes/{favorite.recipe_id}/favorite/',
+                    f'/api/recipes/{cart.recipe_id}/shopping_cart/',
+                    f'/api/users/{following.pk}/subscribe/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(
+            Recipe.objects.get(pk=favorite.recipe_id).favorites_count, 0)
+        self.assertEqual(
+            Recipe.objects.get(pk=cart.recipe_id).in_carts_count, 0)
+        self.assertEqual(
+            User.objects.get(pk=following.pk).followers_count, 0)
+
+    def test_user_flags(self):
+        self.authorize()
+        response = self.client.get(f'/api/recipes/?limit={RECIPES}')
+        flags = {recipe['id']: (recipe['is_favorited'],
+                                recipe['is_in_shopping_cart'],
+                                recipe['author']['is_subscribed'])
+                 for recipe in response.data['results']}
+        for recipe in Recipe.objects.all():
+            self.assertEqual(flags[recipe.pk], (
+                Favorite.objects.filter(
+                    user=self.user, recipe=recipe).exists(),
+                ShoppingCart.objects.filter(
+                    user=self.user, recipe=recipe).exists(),
+                recipe.author.username == 'author0'))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RecipePatchTests(TestCase):
+    """PATCH writes only the difference of the recipe ingredients."""
+
+    # Token lookup with the user, the recipe, its author for the
+    # permission check, the savepoint around the update and its
+    # release, the Recipe stamp bump, then the representation (recipe,
+    # authors, tags, ingredients). Validation adds one lookup per
+    # ingredient sent, the diff one read of the current rows.
+    PATCH_QUERIES = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@foodgram.local',
+            first_name='Автор', last_name='Автор', password='x')
+        cls.token = Token.objects.create(user=cls.user).key
+        cls.ingredients = [Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(4)]
+        tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Текст.',
+            image='recipes/test.png', cooking_time=10)
+        cls.recipe.tags.set((tag,))
+        cls.rows = IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=cls.recipe, ingredient=ingredient,
+                             amount=number + 1)
+            for number, ingredient in enumerate(cls.ingredients[:3]))
+
+    def setUp(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+
+    def patch(self, data, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/', data,
+                content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def get_rows(self):
+        return {row.ingredient_id: (row.pk, row.amount)
+                for row in IngredientRecipe.objects.filter(
+                    recipe=self.recipe)}
+
+    def ingredients_data(self, amounts):
+        return {'ingredients': [
+            {'id': ingredient.pk, 'amount': amount}
+            for ingredient, amount in zip(self.ingredients, amounts)]}
+
+    def test_changed_amount(self):
+        # Read the rows, one bulk UPDATE.
+        response = self.patch(self.ingredients_data((1, 5, 3)),
+                              self.PATCH_QUERIES + 3 + 2)
+        first, second, third = self.rows
+        self.assertEqual(self.get_rows(), {
+            first.ingredient_id: (first.pk, 1),
+            second.ingredient_id: (second.pk, 5),
+            third.ingredient_id: (third.pk, 3)})
+        self.assertEqual(
+            sorted(row['amount'] for row in response.data['ingredients']),
+            [1, 3, 5])
+
+    def test_added_ingredient(self):
+        # Read the rows, one bulk INSERT.
+        self.patch(self.ingredients_data((1, 2, 3, 4)),
+                   self.PATCH_QUERIES + 4 + 2)
+        rows = self.get_rows()
+        self.assertEqual(rows[self.ingredients[3].pk][1], 4)
+        self.assertEqual(
+            {rows[row.ingredient_id] for row in self.rows},
+            {(row.pk, row.amount) for row in self.rows})
+
+    def test_removed_ingredient(self):
+        # Read the rows, then the DELETE: it collects the rows, deletes
+        # them and bumps the Recipe stamp from post_delete.
+        self.patch(self.ingredients_data((1, 2)),
+                   self.PATCH_QUERIES + 2 + 4)
+        first, second, _ = self.rows
+        self.assertEqual(self.get_rows(), {
+            first.ingredient_id: (first.pk, 1),
+            second.ingredient_id: (second.pk, 2)})
+
+    def test_without_ingredients(self):
+        # The recipe UPDATE and the stamp bump from post_save.
+        rows = self.get_rows()
+        self.patch({'cooking_time': 20}, self.PATCH_QUERIES + 2)
+        self.assertEqual(self.get_rows(), rows)
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).cooking_time, 20)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class UserListTests(TestCase):
+    """Favorites and cart toggles keep the flags and counters right."""
+
+    LISTS = (('favorite', Favorite, 'is_favorited', 'favorites_count'),
+             ('shopping_cart', ShoppingCart, 'is_in_shopping_cart',
+              'in_carts_count'))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@foodgram.local',
+            first_name='Читатель', last_name='Читатель', password='x')
+        cls.token = Token.objects.create(user=cls.user).key
+        author = User.objects.create_user(
+            username='author', email='author@foodgram.local',
+            first_name='Автор', last_name='Автор', password='x')
+        cls.recipes = [Recipe.objects.create(
+            author=author, name=f'Рецепт {number}', text='Текст.',
+            image='recipes/test.png', cooking_time=10)
+            for number in range(3)]
+
+    def setUp(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+
+    def assert_state(self, model, flag, counter, expected):
+        """expected maps recipes to (in the list, counter value)."""
+        for recipe, (active, count) in expected.items():
+            self.assertEqual(model.objects.filter(
+                user=self.user, recipe=recipe, **{flag: True}).exists(),
+                active)
+            self.assertEqual(getattr(
+                Recipe.objects.get(pk=recipe.pk), counter), count)
+
+    def test_add_and_remove(self):
+        recipe = self.recipes[0]
+        for name, model, flag, counter in self.LISTS:
+            url = f'/api/recipes/{recipe.pk}/{name}/'
+            with self.subTest(name=name):
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data['id'], recipe.pk)
+                self.assertEqual(response.data['name'], recipe.name)
+                self.assert_state(model, flag, counter, {recipe: (True, 1)})
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.assert_state(model, flag, counter, {recipe: (True, 1)})
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assert_state(model, flag, counter,
+                                  {recipe: (False, 0)})
+                self.assertEqual(self.client.delete(url).status_code, 400)
+                self.assert_state(model, flag, counter,
+                                  {recipe: (False, 0)})
+                # The row stays inactive and is switched back on.
+                self.assertEqual(self.client.post(url).status_code, 201)
+                self.assert_state(model, flag, counter, {recipe: (True, 1)})
+
+    def test_missing_recipe(self):
+        for name, model, _, _ in self.LISTS:
+            url = f'/api/recipes/999999/{name}/'
+            with self.subTest(name=name):
+                self.assertEqual(self.client.post(url).status_code, 404)
+                self.assertEqual(self.client.delete(url).status_code, 404)
+                self.assertFalse(model.objects.exists())
+
+    def test_batch(self):
+        first, second, third = self.recipes
+        for name, model, flag, counter in self.LISTS:
+            url = f'/api/recipes/{name}/batch/'
+            with self.subTest(name=name):
+                self.client.post(f'/api/recipes/{first.pk}/{name}/')
+                response = self.client.post(
+                    url, {'add': [first.pk, second.pk, second.pk, third.pk]},
+                    content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data, {
+                    'added': [second.pk, third.pk], 'removed': []})
+                self.assert_state(model, flag, counter, {
+                    first: (True, 1), second: (True, 1), third: (True, 1)})
+                response = self.client.post(
+                    url, {'remove': [first.pk, second.pk]},
+                    content_type='application/json')
+                self.assertEqual(response.data, {
+                    'added': [], 'removed': [first.pk, second.pk]})
+                self.assert_state(model, flag, counter, {
+                    first: (False, 0), second: (False, 0), third: (True, 1)})
+                response = self.client.post(
+                    url, {'add': [first.pk, 999999]},
+                    content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assert_state(model, flag, counter, {first: (False, 0)})
+
+    def test_counters_do_not_go_below_zero(self):
+        recipe = self.recipes[0]
+        for name, model, flag, counter in self.LISTS:
+            with self.subTest(name=name):
+                self.client.post(f'/api/recipes/{recipe.pk}/{name}/')
+                # Drifted low, e.g. rows created before the counters.
+                Recipe.objects.filter(pk=recipe.pk).update(**{counter: 0})
+                response = self.client.post(
+                    f'/api/recipes/{name}/batch/', {'remove': [recipe.pk]},
+                    content_type='application/json')
+                self.assertEqual(response.data['removed'], [recipe.pk])
+                self.assert_state(model, flag, counter,
+                                  {recipe: (False, 0)})
+
+
+class StoredCounterTests(TestCase):
+    """Admin and ORM writes, cascades included, keep counters right."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.author, cls.other = [User.objects.create_user(
+            username=name, email=f'{name}@foodgram.local',
+            first_name=name, last_name=name, password='x')
+            for name in ('reader', 'author', 'other')]
+
+    def create_recipe(self, author):
+        return Recipe.objects.create(
+            author=author, name='Рецепт', text='Текст.',
+            image='recipes/test.png', cooking_time=10)
+
+    def assert_counts(self, instance, **counts):
+        instance.refresh_from_db(fields=counts)
+        self.assertEqual(
+            {field: getattr(instance, field) for field in counts}, counts)
+
+    def test_recipe_create_and_delete(self):
+        recipes = [self.create_recipe(self.author) for _ in range(2)]
+        self.assert_counts(self.author, recipes_count=2)
+        recipes[0].delete()
+        self.assert_counts(self.author, recipes_count=1)
+        Recipe.objects.filter(pk=recipes[1].pk).delete()
+        self.assert_counts(self.author, recipes_count=0)
+
+    def test_recipe_author_change(self):
+        recipe = self.create_recipe(self.author)
+        recipe.author = self.other
+        recipe.save()
+        self.assert_counts(self.author, recipes_count=0)
+        self.assert_counts(self.other, recipes_count=1)
+        recipe.name = 'Другой рецепт'
+        recipe.save(update_fields=('name',))
+        self.assert_counts(self.other, recipes_count=1)
+
+    def test_user_list_flag(self):
+        recipe = self.create_recipe(self.author)
+        for model, flag, counter in ((Favorite, 'is_favorited',
+                                      'favorites_count'),
+                                     (ShoppingCart, 'is_in_shopping_cart',
+                                      'in_carts_count')):
+            with self.subTest(model=model.__name__):
+                row = model.objects.create(
+                    user=self.reader, recipe=recipe, **{flag: True})
+                self.assert_counts(recipe, **{counter: 1})
+                setattr(row, flag, False)
+                row.save()
+                self.assert_counts(recipe, **{counter: 0})
+                # Compaction drops inactive rows without a change.
+                model.objects.filter(pk=row.pk).delete()
+                self.assert_counts(recipe, **{counter: 0})
+
+    def test_follow(self):
+        follow = Follows.objects.create(user=self.reader,
+                                        following=self.author)
+        self.assert_counts(self.author, followers_count=1)
+        follow.delete()
+        self.assert_counts(self.author, followers_count=0)
+
+    def test_cascade(self):
+        recipe = self.create_recipe(self.author)
+        Favorite.objects.create(
+            user=self.reader, recipe=recipe, is_favorited=True)
+        ShoppingCart.objects.create(
+            user=self.reader, recipe=recipe, is_in_shopping_cart=True)
+        Follows.objects.create(user=self.reader, following=self.author)
+        self.create_recipe(self.reader)
+        self.reader.delete()
+        self.assert_counts(recipe, favorites_count=0, in_carts_count=0)
+        self.assert_counts(self.author, recipes_count=1, followers_count=0)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class KeysetPaginationTests(TestCase):
+    """Cursor pages walk the whole ordering both ways, ties included."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@foodgram.local',
+            first_name='Читатель', last_name='Читатель', password='x')
+        cls.token = Token.objects.create(user=cls.user).key
+        authors = [User.objects.create_user(
+            username=f'author{number}', email=f'author{number}@foodgram.local',
+            first_name='Автор', last_name=str(number), password='x')
+            for number in range(5)]
+        for number in range(7):
+            Recipe.objects.create(
+                author=authors[0], name=f'Рецепт {number}', text='Текст.',
+                image='recipes/test.png', cooking_time=10)
+        # Later follows get lower user ids, so Follows.id and User.id
+        # order differently.
+        for author in reversed(authors):
+            Follows.objects.create(user=cls.user, following=author)
+        now = datetime.now(timezone.utc)
+        Recipe.objects.filter(pk__lte=Recipe.objects.order_by('pk')[4].pk
+                              ).update(created_at=now)
+        Follows.objects.exclude(following=authors[0]).update(created_at=now)
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url):
+        """Follow next links, then previous links back to the start."""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            if not pages:
+                self.assertIsNone(response.data['previous'])
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data['next']
+        backwards = [pages[-1]]
+        url = response.data['previous']
+        while url:
+            response = self.client.get(url)
+            backwards.append(
+                [row['id'] for row in response.data['results']])
+            url = response.data['previous']
+        self.assertEqual(backwards[::-1], pages)
+        return pages
+
+    def test_recipes(self):
+        pages = self.walk('/api/recipes/?pagination=cursor&limit=2')
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(sum(pages, []), list(Recipe.objects.order_by(
+            '-created_at', '-id').values_list('pk', flat=True)))
+
+    def test_subscriptions(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+        pages = self.walk(
+            '/api/users/subscriptions/?pagination=cursor&limit=2')
+        self.assertEqual(sum(pages, []), list(Follows.objects.filter(
+            user=self.user).order_by('-created_at', '-id').values_list(
+            'following_id', flat=True)))
+
+    def test_malformed_cursor(self):
+        for cursor in ('garbage', 'eyJrIjogWzFdfQ==',
+                       encode_cursor({'k': ['x', 'y'], 'r': False}),
+                       encode_cursor({'k': [1], 'r': False})):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(
+                    f'/api/recipes/?cursor={cursor}').status_code, 404)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class AsyncReadTests(TestCase):
+    """The async read path answers exactly like the sync views."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@foodgram.local',
+            first_name='Читатель', last_name='Читатель', password='x')
+        cls.token = Token.objects.create(user=cls.user).key
+        author = User.objects.create_user(
+            username='author', email='author@foodgram.local',
+            first_name='Автор', last_name='Автор', password='x')
+        Follows.objects.create(user=cls.user, following=author)
+        tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст.',
+                image='recipes/test.png', cooking_time=10)
+            recipe.tags.set((tag,))
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=number + 1)
+        Favorite.objects.create(user=cls.user, recipe=recipe,
+                                is_favorited=True)
+        cls.recipe = recipe
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.async_urlconf = get_async_urlconf()
+
+    async def get_both(self, url, handled_async=True, **headers):
+        """Request url from the sync and the async views."""
+        await sync_to_async(cache.clear)()
+        expected = await self.async_client.get(url, headers=headers)
+        await sync_to_async(cache.clear)()
+        calls = []
+        aconditional_response = ConditionalCacheMixin.aconditional_response
+
+        async def record(view, *args, **kwargs):
+            calls.append(view)
+            return await aconditional_response(view, *args, **kwargs)
+
+        with override_settings(ROOT_URLCONF=self.async_urlconf), \
+                mock.patch.object(ConditionalCacheMixin,
+                                  'aconditional_response', record):
+            response = await self.async_client.get(url, headers=headers)
+        self.assertEqual(bool(calls), handled_async)
+        return expected, response
+
+    async def assert_same(self, url, handled_async=True, **headers):
+        expected, response = await self.get_both(
+            url, handled_async, **headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response.get('ETag'), expected.get('ETag'))
+        self.assertEqual(response.get('Vary'), expected.get('Vary'))
+        return response
+
+    def get_urls(self):
+        return (
+            '/api/recipes/',
+            f'/api/recipes/{self.recipe.pk}/',
+            '/api/recipes/999999/',
+            '/api/recipes/?tags=breakfast&is_favorited=1',
+            '/api/ingredients/?name=со',
+        )
+
+    async def test_anonymous(self):
+        for url in self.get_urls():
+            with self.subTest(url=url):
+                await self.assert_same(url)
+
+    async def test_token(self):
+        for url in self.get_urls():
+            with self.subTest(url=url):
+                await self.assert_same(
+                    url, Authorization=f'Token {self.token}')
+
+    async def test_invalid_token(self):
+        # Handed over to the sync view, which answers 401.
+        for url in self.get_urls():
+            for authorization in ('Token bad', 'Token'):
+                with self.subTest(url=url, authorization=authorization):
+                    response = await self.assert_same(
+                        url, handled_async=False,
+                        Authorization=authorization)
+                    self.assertEqual(response.status_code, 401)
+
+    async def test_not_modified(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        authorization = f'Token {self.token}'
+        expected, _ = await self.get_both(url, Authorization=authorization)
+        with override_settings(ROOT_URLCONF=self.async_urlconf):
+            response = await self.async_client.get(url, headers={
+                'Authorization': authorization,
+                'If-None-Match': expected['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], expected['ETag'])
+
+    async def test_pagination(self):
+        for url in ('/api/recipes/?limit=1&page=2',
+                    '/api/recipes/?limit=1&pagination=cursor'):
+            with self.subTest(url=url):
+                response = await self.assert_same(url)
+                page = json.loads(response.content)
+                self.assertEqual(len(page['results']), 1)
+                self.assertIsNotNone(page['next'])
+                response = await self.assert_same(page['next'])
+                self.assertIsNotNone(
+                    json.loads(response.content)['previous'])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ConditionalGetTests(TestCase):
+    """ETags of the cached endpoints follow every write."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_if_none_match(self):
+        response = self.client.get('/api/tags/')
+        etag = response.headers['ETag']
+        self.assertEqual(self.client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Tag.objects.create(name='Обед', slug='lunch')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+    def test_writes_within_one_second(self):
+        with mock.patch('time.time_ns', return_value=10 ** 18):
+            response = self.client.get('/api/tags/')
+        with mock.patch('time.time_ns', return_value=10 ** 18 + 1):
+            Tag.objects.create(name='Обед', slug='lunch')
+        response = self.client.get(
+            '/api/tags/',
+            HTTP_IF_NONE_MATCH=response.headers['ETag'],
+            HTTP_IF_MODIFIED_SINCE=response.headers['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+        response = self.client.get(
+            '/api/tags/',
+            HTTP_IF_MODIFIED_SINCE=response.headers['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_authentication(self):
+        token = Token.objects.create(user=User.objects.create_user(
+            username='reader', email='reader@foodgram.local',
+            first_name='Читатель', last_name='Читатель', password='x'))
+        # The stamp and the tags, plus the token lookup when a token is
+        # sent; a malformed header is refused before any query.
+        for authorization, code, queries in (
+                ('', 200, 2), (f'Token {token.key}', 200, 3),
+                ('Token bad', 401, 1), ('Token', 401, 0)):
+            with self.subTest(authorization=authorization):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = self.client.get(
+                        '/api/tags/', HTTP_AUTHORIZATION=authorization)
+                self.assertEqual(response.status_code, code)
+
+    def test_if_none_match_any(self):
+        url = f'/api/tags/{self.tag.pk}/'
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_NONE_MATCH='*').status_code, 200)
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_NONE_MATCH='*').status_code, 304)
+        response = self.client.get('/api/tags/999999/',
+                                   HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response.headers)
+
+
+@skipUnless(orjson, 'orjson не установлен.')
+class FastJSONRendererTests(SimpleTestCase):
+    """FastJSONRenderer writes what JSONRenderer writes, or raises alike."""
+
+    def assert_same(self, data, **attributes):
+        renderers = (JSONRenderer(), FastJSONRenderer())
+        for renderer in renderers:
+            renderer.__dict__.update(attributes)
+        self.assertEqual(*(renderer.render(data) for renderer in renderers))
+
+    def test_same_bytes(self):
+        for data in (
+            {'name': 'Борщ', 'amount': Decimal('1.50'), 'id': uuid.uuid4(),
+             'created': datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+             'text': 'строка\u2028абзац\u2029', 'image': None,
+             'label': gettext_lazy('теги'), 1: [1.5, True]},
+            [2 ** 64, -2 ** 70],
+            [],
+        ):
+            with self.subTest(data=data):
+                self.assert_same(data)
+
+    def test_not_strict(self):
+        self.assert_same({'value': float('nan')}, strict=False)
+
+    def test_nan_raises(self):
+        for value in (float('nan'), float('inf'), -float('inf')):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                FastJSONRenderer().render({'values': [None, value]})
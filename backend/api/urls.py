@@ -2,7 +2,8 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from api.views import (UserFoodgramViewSet, IngredientViewSet,
-                       TagsViewSet, RecipesViewSet)
+                       TagsViewSet, RecipesViewSet, cache_stats, metrics,
+                       sql_stats)
 
 
 app_name = 'api'
@@ -18,4 +19,7 @@ router.register(r'recipes', RecipesViewSet, basename='recipes')
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('cache-stats/', cache_stats, name='cache-stats'),
+    path('sql-stats/', sql_stats, name='sql-stats'),
+    path('_metrics', metrics, name='metrics'),
 ]
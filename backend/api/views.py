@@ -1,23 +1,43 @@
-from django.http import HttpResponseRedirect
+from itertools import chain
+from secrets import compare_digest
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework import viewsets, status
 from rest_framework.response import Response
+from django.db import transaction
 from django.db.models import Sum, F
+from django.utils.cache import patch_cache_control
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 
+from api.constants import (ALREADY_IN_SHOPPING_CART, NOT_IN_SHOPPING_CART,
+                           NOT_IN_FAVORED, ALREADY_IN_FAVORITED)
 from api.serializers import (IngredientsSerializer, TagsSerializer,
                              RecipeSerializer, RecipePostPatchSerializer,
-                             ShoppingCartSerializer, FavoriteSerializer)
+                             RecipeMinifiedSerializer,
+                             UserListBatchSerializer)
 from recipes.models import (Ingredient, Tag, Recipe,
                             ShoppingCart, IngredientRecipe,
                             Favorite)
-from recipes.services import write_ingredients_to_csv
-from api.filters import RecipeFilterSet, IngredientsFilterSet
+from recipes.services import (bump_model_version, stream_ingredients,
+                              toggle_user_list)
+from recipes.shortlinks import encode_id, short_links
+from api.autocomplete import ingredient_index
+from api.filters import RecipeFilterSet
+from api.metrics import render_metrics
+from api.middleware import get_sql_stats
+from api.mixins import (AsyncReadMixin, ConditionalCacheMixin,
+                        get_cache_stats)
 from api.permissions import (AuthorOrAdminOnly, ReadOrAdminOnly,
                              RecipeAuthorOrAdminOnly)
+from api.renderers import (FastJSONRenderer, ShoppingCartCSVRenderer,
+                           ShoppingCartTextRenderer)
 from djoser.views import UserViewSet
 from api.serializers import FollowSerializer
 from users.models import Follows
@@ -25,25 +45,59 @@ from users.models import Follows
 User = get_user_model()
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalCacheMixin, AsyncReadMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     pagination_class = None
     serializer_class = IngredientsSerializer
-    filter_backends = (IngredientsFilterSet,)
-    search_fields = ('^name',)
+    cache_models = (Ingredient,)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.search, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aconditional_response(
+            self.asearch, request, *args, **kwargs)
+
+    def get_search_params(self):
+        limit = self.request.query_params.get('limit', '')
+        return {'prefix': self.request.query_params.get('name', ''),
+                'limit': int(limit) if limit.isdigit() else None,
+                'ranking': self.request.query_params.get('ranking')}
+
+    def search(self, request, *args, **kwargs):
+        return HttpResponse(
+            ingredient_index.search(**self.get_search_params()),
+            content_type='application/json')
 
+    async def asearch(self, request, *args, **kwargs):
+        return HttpResponse(
+            await ingredient_index.asearch(**self.get_search_params()),
+            content_type='application/json')
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagsViewSet(ConditionalCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     pagination_class = None
     serializer_class = TagsSerializer
+    cache_models = (Tag,)
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(ConditionalCacheMixin, AsyncReadMixin,
+                     viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilterSet
+    cache_models = (Recipe, Ingredient, Tag)
+    cache_per_user = True
+    cursor_ordering = ('-created_at', '-id')
+
+    def get_queryset(self):
+        if self.action in {'list', 'retrieve'}:
+            return Recipe.objects.for_representation(self.get_user())
+        return super().get_queryset()
 
     def get_permissions(self):
         if self.action == 'create':
@@ -55,52 +109,95 @@ class RecipesViewSet(viewsets.ModelViewSet):
     def get_user(self):
         return self.request.user
 
-    def serializer_favorite_or_shopping_cart(self):
-        serializer = self.get_serializer(data=self.request.data)
-        serializer.is_valid(raise_exception=True)
-        return serializer
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+        bump_model_version(Recipe)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+        bump_model_version(Recipe)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
+        bump_model_version(Recipe)
+
+    def get_recipe_pk(self):
+        recipe_pk = self.kwargs.get(self.lookup_field)
+        if not recipe_pk.isdigit():
+            raise Http404
+        return int(recipe_pk)
+
+    def add_to_user_list(self, model, already_added):
+        try:
+            recipes = toggle_user_list(model, self.get_user().pk,
+                                       (self.get_recipe_pk(),), active=True)
+        except Recipe.DoesNotExist:
+            raise Http404
+        if not recipes:
+            raise ValidationError(
+                {key: [message] for key, message in already_added.items()})
+        serializer = RecipeMinifiedSerializer(
+            recipes[0], context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    def get_shopping_cart(self):
-        return get_object_or_404(ShoppingCart, user=self.get_user(),
-                                 recipe=self.get_object())
+    def remove_from_user_list(self, model, not_added):
+        recipe_pk = self.get_recipe_pk()
+        if not toggle_user_list(model, self.get_user().pk, (recipe_pk,),
+                                active=False):
+            get_object_or_404(Recipe, pk=recipe_pk)
+            raise ValidationError(
+                {key: [message] for key, message in not_added.items()})
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def get_favorite(self):
-        return get_object_or_404(Favorite, user=self.get_user(),
-                                 recipe=self.get_object())
+    def batch_user_list(self, model):
+        serializer = UserListBatchSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        user_id = self.get_user().pk
+        with transaction.atomic():
+            added = toggle_user_list(model, user_id,
+                                     serializer.validated_data['add'],
+                                     active=True)
+            removed = toggle_user_list(model, user_id,
+                                       serializer.validated_data['remove'],
+                                       active=False)
+        return Response({'added': sorted(recipe.pk for recipe in added),
+                         'removed': sorted(recipe.pk for recipe in removed)})
 
     def get_serializer_class(self):
         if self.action in {'create', 'partial_update'}:
             return RecipePostPatchSerializer
-        if self.action in {'favorite', 'delete_favorite'}:
-            return FavoriteSerializer
-        if self.action in {'shopping_cart', 'delete_shopping_cart'}:
-            return ShoppingCartSerializer
+        if self.action in {'favorite_batch', 'shopping_cart_batch'}:
+            return UserListBatchSerializer
         return super().get_serializer_class()
 
     @action(('get',), url_path='get-link', detail=True)
     def get_link(self, request, *args, **kwargs):
-        uri = request.build_absolute_uri('/s/')
-        return Response({'short-link': f'{uri}'
-                                       f'{self.get_object().unique_uuid}'})
+        code = encode_id(self.get_recipe_pk())
+        if short_links.resolve_code(code) is None:
+            raise Http404
+        uri = request.build_absolute_uri(f'/s/{code}/')
+        return Response({'short-link': uri})
 
     @action(('post',), detail=True,
             permission_classes=(IsAuthenticated,))
     def shopping_cart(self, request, *args, **kwargs):
-        serializer = self.serializer_favorite_or_shopping_cart()
-        ShoppingCart.objects.update_or_create(
-            recipe=self.get_object(), user=self.get_user(),
-            defaults={'is_in_shopping_cart': True})
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return self.add_to_user_list(ShoppingCart, ALREADY_IN_SHOPPING_CART)
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, *args, **kwargs):
-        self.serializer_favorite_or_shopping_cart()
-        shopping_cart = self.get_shopping_cart()
-        shopping_cart.is_in_shopping_cart = False
-        shopping_cart.save()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.remove_from_user_list(ShoppingCart, NOT_IN_SHOPPING_CART)
 
-    @action(('get',), detail=False, permission_classes=(IsAuthenticated,))
+    @action(('post',), detail=False, url_path='shopping_cart/batch',
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_batch(self, request, *args, **kwargs):
+        return self.batch_user_list(ShoppingCart)
+
+    @action(('get',), detail=False, permission_classes=(IsAuthenticated,),
+            renderer_classes=(ShoppingCartCSVRenderer,
+                              ShoppingCartTextRenderer, FastJSONRenderer))
     def download_shopping_cart(self, request, *args, **kwargs):
         user = request.user
         ingredients = IngredientRecipe.objects.filter(
@@ -108,44 +205,110 @@ class RecipesViewSet(viewsets.ModelViewSet):
             recipe__shoppingcart_recipes__is_in_shopping_cart=True).values(
             ingredient_name=F('ingredient__name'),
             ingredient_unit=F('ingredient__measurement_unit')).annotate(
-            Sum('amount'))
-        if not ingredients:
+            Sum('amount')).order_by(
+            'ingredient_name', 'ingredient_unit').iterator()
+        first_ingredient = next(ingredients, None)
+        if first_ingredient is None:
             return Response({'shopping_cart': 'Корзина пуста'})
-        return write_ingredients_to_csv(ingredients)
+        return stream_ingredients(chain((first_ingredient,), ingredients),
+                                  request.accepted_renderer.format)
 
     @action(('post',), detail=True,
             permission_classes=(IsAuthenticated,))
     def favorite(self, request, *args, **kwargs):
-        serializer = self.serializer_favorite_or_shopping_cart()
-        Favorite.objects.update_or_create(
-            recipe=self.get_object(), user=self.get_user(),
-            defaults={'is_favorited': True})
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return self.add_to_user_list(Favorite, ALREADY_IN_FAVORITED)
 
     @favorite.mapping.delete
     def delete_favorite(self, request, *args, **kwargs):
-        self.serializer_favorite_or_shopping_cart()
-        favorite = self.get_favorite()
-        favorite.is_favorited = False
-        favorite.save()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.remove_from_user_list(Favorite, NOT_IN_FAVORED)
+
+    @action(('post',), detail=False, url_path='favorite/batch',
+            permission_classes=(IsAuthenticated,))
+    def favorite_batch(self, request, *args, **kwargs):
+        return self.batch_user_list(Favorite)
+
+
+@api_view(('GET',))
+@permission_classes((IsAdminUser,))
+def cache_stats(request):
+    return Response(get_cache_stats())
 
 
 @api_view(('GET',))
-def get_recipe(request, *args, **kwargs):
-    recipe = kwargs.get('recipe')
-    recipe = get_object_or_404(Recipe, unique_uuid=recipe)
-    uri = request.build_absolute_uri(f'/recipes/{recipe.id}/')
-    return HttpResponseRedirect(uri)
+@permission_classes((IsAdminUser,))
+def sql_stats(request):
+    return Response({'enabled': settings.SQL_INSTRUMENTATION,
+                     'endpoints': get_sql_stats()})
+
+
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    if token and not compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
+def recipe_redirect(request, recipe_id):
+    response = HttpResponseRedirect(
+        request.build_absolute_uri(f'/recipes/{recipe_id}/'))
+    patch_cache_control(response, public=True,
+                        max_age=settings.SHORT_LINK_MAX_AGE)
+    return response
+
+
+@api_view(('GET',))
+def get_recipe(request, recipe=None, code=None):
+    if code is not None:
+        recipe_id = short_links.resolve_code(code)
+    else:
+        recipe_id = short_links.resolve_uuid(recipe)
+    if recipe_id is None:
+        raise Http404
+    return recipe_redirect(request, recipe_id)
+
+
+async def aget_recipe(request, recipe=None, code=None):
+    """get_recipe for ASGI: known links are answered on the event loop."""
+    recipe_id = None
+    if request.method == 'GET':
+        if code is not None:
+            recipe_id = await short_links.aresolve_code(code)
+        else:
+            recipe_id = await short_links.aresolve_uuid(recipe)
+    if recipe_id is None:
+        return await sync_to_async(get_recipe)(
+            request, recipe=recipe, code=code)
+    return recipe_redirect(request, recipe_id)
 
 
 class UserFoodgramViewSet(UserViewSet):
 
+    @property
+    def cursor_ordering(self):
+        if self.action == 'subscriptions':
+            # The index of Follows on (user, -created_at, -id).
+            return ('-followed_at', '-follow_id')
+        return None
+
+    def get_queryset(self):
+        return super().get_queryset().with_is_subscribed(self.request.user)
+
     def get_permissions(self):
         if self.action == 'retrieve':
             self.permission_classes = (ReadOrAdminOnly,)
         return super().get_permissions()
 
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None or not recipes_limit.isdigit():
+            return None
+        return int(recipes_limit)
+
+    def get_subscriptions_queryset(self):
+        return self.get_queryset().with_recipes(self.get_recipes_limit())
+
     def get_serializer_class(self):
         if self.action in {'subscribe', 'subscriptions'}:
             return FollowSerializer
@@ -174,8 +337,8 @@ class UserFoodgramViewSet(UserViewSet):
         if request.method == 'POST':
             serializer = self.get_serializer(user, data={})
             serializer.is_valid(raise_exception=True)
-            Follows.objects.create(user=user, following=follower)
-
+            with transaction.atomic():
+                Follows.objects.create(user=user, following=follower)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         follow = get_object_or_404(Follows, user=user, following=follower)
@@ -185,7 +348,10 @@ class UserFoodgramViewSet(UserViewSet):
     @action(('get',), detail=False, permission_classes=(AuthorOrAdminOnly,))
     def subscriptions(self, request, *args, **kwargs):
         user = request.user
-        queryset = User.objects.filter(followers__user=user)
+        queryset = self.get_subscriptions_queryset().filter(
+            followers__user=user).annotate(
+            followed_at=F('followers__created_at'),
+            follow_id=F('followers__id'))
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
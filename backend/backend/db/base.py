@@ -0,0 +1,53 @@
+import time
+
+from django.db.backends.postgresql import base
+
+from api import metrics
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend that reports on its persistent connections.
+
+    Django keeps one connection per worker thread for CONN_MAX_AGE
+    seconds and, with CONN_HEALTH_CHECKS, pings it before reuse in a
+    new request. There is no pool to wait for: a thread without a
+    usable connection opens one. This wrapper exports how often that
+    happens and how long the connect takes, how many connections are
+    open, how long they are busy running queries (busy seconds over
+    open connections is their utilisation) and how many failed the
+    ping.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.execute_wrappers.append(self.record_busy)
+
+    def record_busy(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            metrics.DB_BUSY.labels(self.alias).inc(
+                time.perf_counter() - started)
+
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        metrics.DB_CONNECT_DURATION.labels(self.alias).observe(
+            time.perf_counter() - started)
+        metrics.DB_CONNECTIONS_OPEN.labels(self.alias).inc()
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return None
+        try:
+            return super()._close()
+        finally:
+            metrics.DB_CONNECTIONS_OPEN.labels(self.alias).dec()
+
+    def close_if_health_check_failed(self):
+        connection = self.connection
+        super().close_if_health_check_failed()
+        if connection is not None and self.connection is None:
+            metrics.DB_HEALTH_CHECK_FAILURES.labels(self.alias).inc()
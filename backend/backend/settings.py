@@ -44,12 +44,15 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
+    'jobs.apps.JobsConfig',
     'djoser'
 ]
 
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.SQLInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,17 +82,76 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Connections are persistent: each gunicorn worker thread keeps its own
+# for DB_CONN_MAX_AGE seconds and pings it before reusing it in a new
+# request, so the number of connections is workers * threads.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'backend.db',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Cached responses and the cache statistics may stay per process: the
+# bodies are keyed by version stamps, which live in the database.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    },
+}
+
+# Per-request SQL instrumentation: Server-Timing header, json log lines
+# in the api.sql logger and /api/sql-stats/. A query shape repeated
+# SQL_REPEATED_QUERY_THRESHOLD times in one request is reported as a
+# likely N+1.
+SQL_INSTRUMENTATION = os.getenv(
+    'SQL_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+SQL_REPEATED_QUERY_THRESHOLD = int(
+    os.getenv('SQL_REPEATED_QUERY_THRESHOLD', 5))
+
+# Prometheus metrics at /api/_metrics. gunicorn.conf.py sets
+# PROMETHEUS_MULTIPROC_DIR so the workers share one file-backed store.
+# METRICS_TOKEN, when set, has to be sent as "Authorization: Bearer ...".
+METRICS_ENABLED = os.getenv(
+    'METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_MAX_ENDPOINTS = int(os.getenv('METRICS_MAX_ENDPOINTS', 200))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Serve GET of the recipe list and detail, the ingredient search and the
+# short links with async views. backend/asgi.py turns it on by default.
+ASYNC_VIEWS = os.getenv(
+    'ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.sql': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Short links: size of the per-process LRU, an optional CACHES alias
+# shared by all workers, and how long nginx and browsers may keep the
+# redirect.
+SHORT_LINK_LRU_SIZE = int(os.getenv('SHORT_LINK_LRU_SIZE', 10000))
+SHORT_LINK_CACHE = os.getenv('SHORT_LINK_CACHE')
+SHORT_LINK_MAX_AGE = int(os.getenv('SHORT_LINK_MAX_AGE', 3600))
+
 CSRF_TRUSTED_ORIGINS = ['https://kiselevfoodgram.ddns.net']
 
 # Password validation
@@ -116,6 +178,15 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.FoodgramPageNumberPagination',
     'PAGE_SIZE': 6,
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, connections
+from django.test import TransactionTestCase, override_settings
+from prometheus_client import CollectorRegistry, multiprocess
+
+from api import metrics
+from api.tests import LOCAL_CACHES
+from backend.db.base import DatabaseWrapper
+
+REQUESTS = 5
+# A management command: opens a connection and exits without closing it.
+COMMAND = '''
+import sys
+import django
+django.setup()
+from django.db import connection
+connection.settings_dict['NAME'] = sys.argv[1]
+connection.ensure_connection()
+'''
+
+
+def sample(name):
+    value = metrics.get_registry().get_sample_value(
+        name, {'database': connection.alias})
+    return value or 0
+
+
+@skipUnless(isinstance(connections['default'], DatabaseWrapper),
+            'Нужен движок backend.db (PostgreSQL).')
+@override_settings(CACHES=LOCAL_CACHES)
+class PersistentConnectionTests(TransactionTestCase):
+    """Requests reuse the connection of their thread."""
+
+    def run_requests(self, max_age):
+        """Serve REQUESTS requests; return the connects and open delta."""
+        connection.close()
+        connects = sample('foodgram_db_connect_duration_seconds_count')
+        opened = sample('foodgram_db_connections_open')
+        with mock.patch.dict(connection.settings_dict,
+                             CONN_MAX_AGE=max_age):
+            for _ in range(REQUESTS):
+                cache.clear()
+                self.assertEqual(
+                    self.client.get('/api/tags/').status_code, 200)
+                # What the handler runs on request_finished; the test
+                # client skips it.
+                close_old_connections()
+        return (
+            sample('foodgram_db_connect_duration_seconds_count') - connects,
+            sample('foodgram_db_connections_open') - opened)
+
+    def test_connection_is_reused(self):
+        self.assertEqual(self.run_requests(max_age=60), (1, 1))
+
+    def test_connection_per_request_without_max_age(self):
+        self.assertEqual(self.run_requests(max_age=0), (REQUESTS, 0))
+
+    def test_broken_connection_is_replaced(self):
+        self.run_requests(max_age=60)
+        failures = sample('foodgram_db_health_check_failures_total')
+        with mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=60):
+            connection.connection.close()
+            cache.clear()
+            self.assertEqual(self.client.get('/api/tags/').status_code, 200)
+        self.assertEqual(
+            sample('foodgram_db_health_check_failures_total') - failures, 1)
+
+    def test_busy_time(self):
+        busy = sample('foodgram_db_busy_seconds_total')
+        self.run_requests(max_age=60)
+        self.assertGreater(sample('foodgram_db_busy_seconds_total'), busy)
+
+    def test_other_process_leaves_no_open_connections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            subprocess.run(
+                [sys.executable, '-c', COMMAND,
+                 connection.settings_dict['NAME']],
+                cwd=settings.BASE_DIR, check=True,
+                env={**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory})
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry, directory)
+            labels = {'database': connection.alias}
+            self.assertEqual(registry.get_sample_value(
+                'foodgram_db_connect_duration_seconds_count', labels), 1)
+            self.assertIsNone(registry.get_sample_value(
+                'foodgram_db_connections_open', labels))
@@ -1,15 +1,19 @@
 from django.contrib import admin
 from django.conf import settings
 from django.conf.urls.static import static
-from django.urls import include, path
+from django.urls import include, path, re_path
 
-from api.views import get_recipe
+from api.views import aget_recipe, get_recipe
+from recipes.shortlinks import CODE_PATTERN
 
+recipe_link = aget_recipe if settings.ASYNC_VIEWS else get_recipe
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls', namespace='api')),
-    path('s/<uuid:recipe>/', get_recipe, name='recipes-uuid')
+    path('s/<uuid:recipe>/', recipe_link, name='recipes-uuid'),
+    re_path(rf'^s/(?P<code>{CODE_PATTERN})/$', recipe_link,
+            name='recipes-short-link'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,36 @@
+import os
+import shutil
+
+# Every worker thread holds one persistent database connection, so
+# workers * threads is the size of the connection pool of a container.
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+# GUNICORN_ASGI=true serves backend.asgi with uvicorn workers instead of
+# the sync ones: GET of the read-heavy endpoints then runs async views.
+if os.getenv('GUNICORN_ASGI', '').lower() in ('1', 'true', 'yes'):
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'backend.wsgi:application'
+
+# Workers share metrics through files. Only the server gets the
+# directory: manage.py commands and the job worker run from the same
+# image and keep their metrics in memory. prometheus_client picks the
+# mode on import, so it is imported only once this is set.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+
+
+def on_starting(server):
+    """Start with an empty shared metrics store."""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a finished worker; counters are kept."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
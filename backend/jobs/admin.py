@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from jobs.models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'task',
+        'state',
+        'attempts',
+        'run_at',
+    )
+    list_filter = ('state',)
+    search_fields = ('task',)
+    readonly_fields = ('locked_at', 'locked_by', 'last_error')
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,75 @@
+import os
+import signal
+import socket
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from jobs.services import claim_job, run_job
+
+ERROR_BACKOFF = 1
+MAX_ERROR_BACKOFF = 30
+
+
+class Command(BaseCommand):
+    help = 'Выполнять фоновые задачи из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить все готовые задачи и завершиться.')
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста.')
+        parser.add_argument(
+            '--lock-timeout', type=int, default=600,
+            help='Через сколько секунд зависшая задача снова '
+                 'считается свободной.')
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        lock_timeout = timedelta(seconds=options['lock_timeout'])
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.stdout.write(f'Обработчик {worker} запущен.')
+        backoff = ERROR_BACKOFF
+        while self.running:
+            close_old_connections()
+            try:
+                job = claim_job(worker, lock_timeout)
+                if job is not None:
+                    self.run(job)
+            except DatabaseError as error:
+                # The database restarts, or jobs_job is not migrated yet.
+                # A job left running is taken over after lock_timeout.
+                message = str(error).strip().partition('\n')[0]
+                self.stderr.write(f'Ошибка базы данных ({message}), '
+                                  f'повтор через {backoff} с.')
+                self.pause(backoff)
+                backoff = min(backoff * 2, MAX_ERROR_BACKOFF)
+                continue
+            backoff = ERROR_BACKOFF
+            if job is None:
+                if options['once']:
+                    break
+                self.pause(options['sleep'])
+
+    def run(self, job):
+        started = time.monotonic()
+        run_job(job)
+        self.stdout.write(
+            f'{job.task} #{job.pk}: {job.get_state_display()} '
+            f'за {time.monotonic() - started:.2f} с, '
+            f'попытка {job.attempts}/{job.max_attempts}.')
+
+    def pause(self, seconds):
+        """Sleep, waking up within a second of a stop signal."""
+        deadline = time.monotonic() + seconds
+        while self.running and time.monotonic() < deadline:
+            time.sleep(min(deadline - time.monotonic(), 1))
+
+    def stop(self, *args):
+        self.running = False
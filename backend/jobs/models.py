@@ -0,0 +1,61 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Function call queued to run outside of the request.
+
+    queued -> running -> done, or back to queued with a backoff while
+    attempts remain, or failed once they are exhausted.
+    """
+
+    class State(models.TextChoices):
+        QUEUED = 'queued', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Выполнена'
+        FAILED = 'failed', 'Ошибка'
+
+    TRANSITIONS = {
+        State.QUEUED: {State.RUNNING},
+        State.RUNNING: {State.DONE, State.QUEUED, State.FAILED},
+        State.DONE: set(),
+        State.FAILED: {State.QUEUED},
+    }
+
+    task = models.CharField(max_length=255, verbose_name='Функция')
+    args = models.JSONField(default=list, blank=True,
+                            verbose_name='Аргументы')
+    kwargs = models.JSONField(default=dict, blank=True,
+                              verbose_name='Именованные аргументы')
+    state = models.CharField(max_length=16, choices=State.choices,
+                             default=State.QUEUED, verbose_name='Состояние')
+    attempts = models.PositiveSmallIntegerField(default=0,
+                                                verbose_name='Попытки')
+    max_attempts = models.PositiveSmallIntegerField(
+        default=5, verbose_name='Максимум попыток')
+    run_at = models.DateTimeField(default=timezone.now,
+                                  verbose_name='Запустить после')
+    locked_at = models.DateTimeField(null=True, blank=True,
+                                     verbose_name='Взята в работу')
+    locked_by = models.CharField(max_length=255, blank=True,
+                                 verbose_name='Обработчик')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Добавлена')
+
+    class Meta:
+        ordering = ('run_at',)
+        indexes = [
+            models.Index(fields=('state', 'run_at'),
+                         name='job_state_run_at'),
+        ]
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+
+    def __str__(self):
+        return f'{self.task} ({self.get_state_display()})'
+
+    def move_to(self, state):
+        if state not in self.TRANSITIONS[self.state]:
+            raise ValueError(f'Job cannot move from {self.state} to {state}.')
+        self.state = state
@@ -0,0 +1,84 @@
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from jobs.models import Job
+
+RETRY_BACKOFF = timedelta(seconds=5)
+MAX_RETRY_BACKOFF = timedelta(hours=1)
+
+
+def background(max_attempts=5):
+    """Let the function be queued from a view with func.delay(...).
+
+    The job row is written in the caller's transaction, so it is only
+    picked up by runworker once that transaction commits. Arguments must
+    be json serializable.
+    """
+    def decorator(func):
+        task = f'{func.__module__}.{func.__name__}'
+
+        def delay(*args, **kwargs):
+            return Job.objects.create(task=task, args=list(args),
+                                      kwargs=kwargs,
+                                      max_attempts=max_attempts)
+
+        func.delay = delay
+        return func
+    return decorator
+
+
+def get_retry_backoff(attempts):
+    return min(RETRY_BACKOFF * 2 ** (attempts - 1), MAX_RETRY_BACKOFF)
+
+
+def claim_job(worker, lock_timeout):
+    """Take the next due job, skipping rows locked by other workers.
+
+    Running jobs whose worker has not finished them within lock_timeout
+    are taken over as well. The final conditional update makes the claim
+    safe on databases without SELECT ... FOR UPDATE, like SQLite.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            Q(state=Job.State.QUEUED, run_at__lte=now)
+            | Q(state=Job.State.RUNNING, locked_at__lt=now - lock_timeout)
+        ).order_by('run_at', 'pk').first()
+        if job is None:
+            return None
+        previous_state, previous_attempts = job.state, job.attempts
+        if job.state == Job.State.RUNNING:
+            job.move_to(Job.State.QUEUED)
+        job.move_to(Job.State.RUNNING)
+        job.attempts += 1
+        job.locked_at = now
+        job.locked_by = worker
+        claimed = Job.objects.filter(
+            pk=job.pk, state=previous_state, attempts=previous_attempts
+        ).update(state=job.state, attempts=job.attempts,
+                 locked_at=job.locked_at, locked_by=job.locked_by)
+    return job if claimed else None
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome."""
+    try:
+        import_string(job.task)(*job.args, **job.kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.move_to(Job.State.QUEUED)
+            job.run_at = timezone.now() + get_retry_backoff(job.attempts)
+        else:
+            job.move_to(Job.State.FAILED)
+    else:
+        job.move_to(Job.State.DONE)
+        job.last_error = ''
+    job.locked_at = None
+    job.save(update_fields=('state', 'run_at', 'locked_at', 'last_error'))
+    return job
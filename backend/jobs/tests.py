@@ -0,0 +1,43 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError, ProgrammingError
+from django.test import TransactionTestCase
+
+from jobs.management.commands.runworker import Command
+from jobs.models import Job
+from jobs.services import claim_job
+
+calls = []
+
+
+def record(value):
+    calls.append(value)
+
+
+class RunWorkerTests(TransactionTestCase):
+    """runworker outlives database errors."""
+
+    def test_database_errors_are_retried(self):
+        calls.clear()
+        Job.objects.create(task='jobs.tests.record', args=[1])
+        errors = [OperationalError('server closed the connection'),
+                  ProgrammingError('relation "jobs_job" does not exist')]
+
+        def flaky_claim_job(*args):
+            if errors:
+                raise errors.pop(0)
+            return claim_job(*args)
+
+        stderr = StringIO()
+        with mock.patch('jobs.management.commands.runworker.claim_job',
+                        flaky_claim_job), \
+                mock.patch.object(Command, 'pause') as pause:
+            call_command('runworker', once=True, stdout=StringIO(),
+                         stderr=stderr)
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.objects.get().state, Job.State.DONE)
+        self.assertEqual([call.args for call in pause.call_args_list],
+                         [(1,), (2,)])
+        self.assertIn('jobs_job', stderr.getvalue())
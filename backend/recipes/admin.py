@@ -21,11 +21,8 @@ class RecipeAdmin(admin.ModelAdmin):
         'author__email'
     )
     list_filter = ('tags',)
-    filter_horizontal = (
-        'tags',
-        'ingredients'
-    )
-    readonly_fields = ('is_favorited_count',)
+    filter_horizontal = ('tags',)
+    readonly_fields = ('favorites_count', 'in_carts_count')
 
 
 class IngredientAdmin(admin.ModelAdmin):
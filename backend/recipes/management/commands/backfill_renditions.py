@@ -0,0 +1,39 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.renditions import create_renditions
+from recipes.services import bump_model_version
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Создать уменьшенные копии и WebP-версии для уже загруженных '
+            'фото рецептов и аватаров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать уже существующие копии.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        images = written = 0
+        sources = (
+            Recipe.objects.exclude(image='').only('image'),
+            User.objects.exclude(avatar='').exclude(
+                avatar__isnull=True).only('avatar'),
+        )
+        for queryset, field in zip(sources, ('image', 'avatar')):
+            for instance in queryset.iterator():
+                images += 1
+                written += create_renditions(
+                    getattr(instance, field), force=options['force'])
+        if written:
+            bump_model_version(Recipe)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {images}, создано файлов: {written}. '
+            f'Время: {time.monotonic() - started:.2f} с.'))
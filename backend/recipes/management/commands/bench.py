@@ -0,0 +1,355 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.client import HTTPConnection
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode, urlsplit
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from recipes.services import toggle_user_list
+from users.models import Follows
+
+User = get_user_model()
+
+QUERIES_HEADER = 'X-Bench-Queries'
+CART_SIZE = 5
+
+
+class Workload:
+    """Data one bench thread draws its requests from."""
+
+    def __init__(self, rng, recipe_ids, tag_slugs, prefixes):
+        self.rng = rng
+        self.recipe_ids = recipe_ids
+        self.tag_slugs = tag_slugs
+        self.prefixes = prefixes
+
+    def recipe_id(self):
+        return self.rng.choice(self.recipe_ids)
+
+    def toggled_recipe_id(self):
+        """A recipe outside the cart every bench user starts with."""
+        return self.rng.choice(
+            self.recipe_ids[CART_SIZE:] or self.recipe_ids)
+
+
+def browse_recipes(workload):
+    pages = (len(workload.recipe_ids) + 5) // 6
+    page = workload.rng.randint(1, min(5, pages))
+    yield 'recipes:list', 'GET', f'/api/recipes/?page={page}&limit=6'
+
+
+def recipe_detail(workload):
+    yield 'recipes:detail', 'GET', f'/api/recipes/{workload.recipe_id()}/'
+
+
+def filter_by_tags(workload):
+    slugs = workload.rng.sample(
+        workload.tag_slugs, min(2, len(workload.tag_slugs)))
+    query = urlencode([('tags', slug) for slug in slugs] + [('limit', 6)])
+    yield 'recipes:tags', 'GET', f'/api/recipes/?{query}'
+
+
+def autocomplete_ingredients(workload):
+    query = urlencode({'name': workload.rng.choice(workload.prefixes)})
+    yield 'ingredients:search', 'GET', f'/api/ingredients/?{query}'
+
+
+def toggle_favorite(workload):
+    url = f'/api/recipes/{workload.toggled_recipe_id()}/favorite/'
+    yield 'favorite:add', 'POST', url
+    yield 'favorite:remove', 'DELETE', url
+
+
+def toggle_shopping_cart(workload):
+    url = f'/api/recipes/{workload.toggled_recipe_id()}/shopping_cart/'
+    yield 'shopping_cart:add', 'POST', url
+    yield 'shopping_cart:remove', 'DELETE', url
+
+
+def download_shopping_cart(workload):
+    yield ('shopping_cart:download', 'GET',
+           '/api/recipes/download_shopping_cart/?format=txt')
+
+
+def list_subscriptions(workload):
+    yield ('users:subscriptions', 'GET',
+           '/api/users/subscriptions/?limit=6&recipes_limit=3')
+
+
+# Scenarios of postman_collection/ and how often users run them.
+SCENARIOS = {
+    'browse_recipes': (browse_recipes, 30),
+    'recipe_detail': (recipe_detail, 15),
+    'filter_by_tags': (filter_by_tags, 15),
+    'autocomplete_ingredients': (autocomplete_ingredients, 20),
+    'toggle_favorite': (toggle_favorite, 5),
+    'toggle_shopping_cart': (toggle_shopping_cart, 5),
+    'download_shopping_cart': (download_shopping_cart, 5),
+    'list_subscriptions': (list_subscriptions, 5),
+}
+
+
+@contextmanager
+def count_queries(counter):
+    def wrapper(execute, sql, params, many, context):
+        counter[0] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield
+
+
+def counting_application(application):
+    """WSGI app that reports the SQL query count in a response header.
+
+    The body is built before the headers are sent, so the count is final.
+    """
+    def wrapped(environ, start_response):
+        counter = [0]
+        collected = {}
+
+        def collect(status, headers, exc_info=None):
+            collected.update(status=status, headers=headers)
+            return lambda data: None
+
+        with count_queries(counter):
+            response = application(environ, collect)
+            try:
+                body = b''.join(response)
+            finally:
+                getattr(response, 'close', lambda: None)()
+        start_response(collected['status'], collected['headers'] + [
+            (QUERIES_HEADER, str(counter[0]))])
+        return [body]
+
+    return wrapped
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    rank = max(1, round(percent / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+class Command(BaseCommand):
+    help = ('Прогнать сценарии postman_collection/ как взвешенную '
+            'нагрузку в несколько потоков и вывести p50/p95/p99, '
+            'пропускную способность и число SQL-запросов по эндпоинтам '
+            'в формате JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Количество параллельных потоков (и тестовых '
+                 'пользователей).')
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Количество сценариев на поток.')
+        parser.add_argument(
+            '--warmup', type=int, default=20,
+            help='Сценарии на поток, не попадающие в отчёт.')
+        parser.add_argument(
+            '--scenarios', nargs='+', choices=SCENARIOS,
+            help='Запустить только указанные сценарии.')
+        parser.add_argument(
+            '--server', action='store_true',
+            help='Отправлять запросы в локальный WSGI-сервер вместо '
+                 'тестового клиента Django.')
+        parser.add_argument(
+            '--url',
+            help='Адрес уже запущенного сервера (например, gunicorn с '
+                 'sync- или ASGI-воркерами), чтобы сравнить развёртывания. '
+                 'Число SQL-запросов в этом режиме не считается.')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел.')
+        parser.add_argument(
+            '--output', help='Записать отчёт в файл вместо stdout.')
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True)[:1000])
+        tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        prefixes = sorted({name[:2].lower() for name in Ingredient.objects.
+                           values_list('name', flat=True)[:500]})
+        if not recipe_ids or not tag_slugs or not prefixes:
+            raise CommandError(
+                'Нужны рецепты, теги и ингредиенты: сгенерируйте '
+                'тестовые данные командой seed_scale.')
+        scenarios = {name: SCENARIOS[name]
+                     for name in options['scenarios'] or SCENARIOS}
+        tokens = self.prepare_users(options['threads'], recipe_ids)
+        server = None
+        address = None
+        if options['url']:
+            url = urlsplit(options['url'])
+            address = (url.hostname, url.port or 80)
+        elif options['server']:
+            server = make_server(
+                '127.0.0.1', 0, counting_application(get_wsgi_application()),
+                server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            address = server.server_address
+        samples = defaultdict(list)
+        lock = threading.Lock()
+
+        def run(number, token):
+            rng = random.Random(options['seed'] + number)
+            workload = Workload(rng, recipe_ids, tag_slugs, prefixes)
+            send = (self.http_sender(address, token) if address
+                    else self.client_sender(token))
+            names = list(scenarios)
+            weights = [weight for _, weight in scenarios.values()]
+            try:
+                for step in range(options['warmup'] + options['requests']):
+                    scenario, _ = scenarios[rng.choices(names, weights)[0]]
+                    for endpoint, method, url in scenario(workload):
+                        sample = send(method, url)
+                        if step >= options['warmup']:
+                            with lock:
+                                samples[endpoint].append(sample)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(number, token))
+                   for number, token in enumerate(tokens)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if server:
+            server.shutdown()
+        report = self.build_report(samples, elapsed, options)
+        report = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
+
+    def prepare_users(self, count, recipe_ids):
+        """Bench users with tokens, a few follows and a filled cart."""
+        authors = list(User.objects.filter(
+            recipes__isnull=False).distinct().values_list('pk', flat=True)[:5])
+        tokens = []
+        for number in range(count):
+            user, _ = User.objects.get_or_create(
+                email=f'bench-{number}@foodgram.local',
+                defaults={'username': f'bench-{number}',
+                          'first_name': 'Bench', 'last_name': 'Bench'})
+            tokens.append(Token.objects.get_or_create(user=user)[0].key)
+            for author_id in authors:
+                if author_id == user.pk:
+                    continue
+                Follows.objects.get_or_create(
+                    user=user, following_id=author_id)
+            if not ShoppingCart.objects.filter(
+                    user=user, is_in_shopping_cart=True).exists():
+                toggle_user_list(ShoppingCart, user.pk,
+                                 recipe_ids[:CART_SIZE], True)
+        return tokens
+
+    @staticmethod
+    def client_sender(token):
+        client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+
+        def send(method, url):
+            counter = [0]
+            started = time.perf_counter()
+            with count_queries(counter):
+                response = getattr(client, method.lower())(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            return (time.perf_counter() - started, response.status_code,
+                    counter[0])
+        return send
+
+    @staticmethod
+    def http_sender(address, token):
+        http = HTTPConnection(*address)
+        headers = {'Authorization': f'Token {token}'}
+
+        def send(method, url):
+            started = time.perf_counter()
+            http.request(method, url, headers=headers)
+            response = http.getresponse()
+            response.read()
+            queries = response.getheader(QUERIES_HEADER)
+            return (time.perf_counter() - started, response.status,
+                    int(queries) if queries is not None else None)
+        return send
+
+    @staticmethod
+    def build_report(samples, elapsed, options):
+        def summary(endpoint_samples):
+            latencies = sorted(latency * 1000
+                               for latency, _, _ in endpoint_samples)
+            queries = [count for _, _, count in endpoint_samples
+                       if count is not None]
+            return {
+                'requests': len(endpoint_samples),
+                'errors': sum(status >= 500
+                              for _, status, _ in endpoint_samples),
+                'statuses': dict(sorted(Counter(
+                    str(status) for _, status, _ in endpoint_samples
+                ).items())),
+                'throughput_rps': round(len(endpoint_samples) / elapsed, 2),
+                'latency_ms': {
+                    'p50': round(percentile(latencies, 50), 3),
+                    'p95': round(percentile(latencies, 95), 3),
+                    'p99': round(percentile(latencies, 99), 3),
+                    'mean': round(statistics.fmean(latencies), 3),
+                    'max': round(latencies[-1], 3),
+                },
+                'queries_per_request': {
+                    'mean': round(statistics.fmean(queries), 2),
+                    'max': max(queries),
+                } if queries else None,
+            }
+
+        try:
+            revision = subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                capture_output=True, text=True, check=False).stdout.strip()
+        except OSError:
+            revision = ''
+        everything = [sample for endpoint_samples in samples.values()
+                      for sample in endpoint_samples]
+        return {
+            'revision': revision or None,
+            'database': connection.vendor,
+            'mode': ('url' if options['url'] else
+                     'server' if options['server'] else 'client'),
+            'url': options['url'],
+            'threads': options['threads'],
+            'seconds': round(elapsed, 3),
+            'total': summary(everything) if everything else None,
+            'endpoints': {endpoint: summary(samples[endpoint])
+                          for endpoint in sorted(samples)},
+        }
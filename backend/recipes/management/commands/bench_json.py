@@ -0,0 +1,104 @@
+import statistics
+import time
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.constants import ALREADY_IN_FAVORITED
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import IngredientsSerializer, RecipeSerializer
+from recipes.models import Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сравнить рендеринг и разбор JSON стандартным модулем json и '
+            'через orjson на страницах рецептов и полном списке '
+            'ингредиентов, проверив, что ответы совпадают побайтно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, nargs='+', default=[6, 100],
+            help='Размеры страниц списка рецептов.')
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Сколько раз отрендерить и разобрать каждый ответ.')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson не установлен: обе реализации используют json.'))
+        payloads = self.build_payloads(options['limit'])
+        renderers = {'json': JSONRenderer(), 'orjson': FastJSONRenderer()}
+        parsers = {'json': JSONParser(), 'orjson': FastJSONParser()}
+        for name, data in payloads.items():
+            rendered = {engine: renderer.render(data)
+                        for engine, renderer in renderers.items()}
+            if rendered['json'] != rendered['orjson']:
+                raise CommandError(f'{name}: ответы orjson и json '
+                                   f'различаются.')
+            body = rendered['json']
+            self.stdout.write(f'{name}: {len(body)} байт, ответы совпадают')
+            timings = {
+                'render': {engine: self.measure(
+                    lambda renderer=renderer: renderer.render(data),
+                    options['repeat'])
+                    for engine, renderer in renderers.items()},
+                'parse': {engine: self.measure(
+                    lambda parser=parser: parser.parse(BytesIO(body)),
+                    options['repeat'])
+                    for engine, parser in parsers.items()},
+            }
+            for operation, engines in timings.items():
+                (stdlib, stdlib_p95), (fast, fast_p95) = (
+                    engines['json'], engines['orjson'])
+                self.stdout.write(
+                    f'{operation:>8}: json {stdlib:.3f} мс '
+                    f'(p95 {stdlib_p95:.3f}), orjson {fast:.3f} мс '
+                    f'(p95 {fast_p95:.3f}), '
+                    f'в {stdlib / fast:.1f} раза быстрее')
+
+    @staticmethod
+    def build_payloads(limits):
+        recipes = Recipe.objects.for_representation(AnonymousUser()).order_by(
+            '-created_at', '-id')
+        if not recipes.exists():
+            raise CommandError('Нет рецептов: сгенерируйте тестовые данные '
+                               'командой seed_scale.')
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        payloads = {}
+        for limit in limits:
+            results = RecipeSerializer(
+                recipes[:limit], many=True,
+                context={'request': request}).data
+            payloads[f'recipes[{len(results)}]'] = {
+                'count': recipes.count(), 'next': None, 'previous': None,
+                'results': results}
+        payloads['ingredients'] = IngredientsSerializer(
+            Ingredient.objects.all(), many=True).data
+        payloads['types'] = [
+            {'unique_uuid': recipe.unique_uuid,
+             'created_at': recipe.created_at,
+             'amount': Decimal('12.50'),
+             'message': gettext_lazy(ALREADY_IN_FAVORITED['errors'])}
+            for recipe in Recipe.objects.order_by('-id')[:100]]
+        return payloads
+
+    @staticmethod
+    def measure(function, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return (statistics.median(timings),
+                timings[min(len(timings) - 1, int(len(timings) * 0.95))])
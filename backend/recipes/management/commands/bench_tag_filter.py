@@ -0,0 +1,122 @@
+import random
+import statistics
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from recipes.models import Recipe, RecipeTag, Tag
+from recipes.services import bump_model_version, get_tag_ids
+
+User = get_user_model()
+
+BENCH_TAGS = ('breakfast', 'lunch', 'dinner', 'dessert', 'vegan')
+
+
+def distinct_plan(slugs):
+    """The old plan: join the tags and dedupe the joined rows."""
+    return Recipe.objects.filter(tags__slug__in=slugs).distinct()
+
+
+def exists_plan(slugs):
+    """The current plan: a semi-join on the through table by tag id."""
+    return Recipe.objects.filter(Exists(RecipeTag.objects.filter(
+        recipe=OuterRef('pk'), tag__in=get_tag_ids(slugs))))
+
+
+PLANS = {
+    'distinct': distinct_plan,
+    'exists': exists_plan,
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнить фильтрацию рецептов по тегам через JOIN + DISTINCT '
+            'и через EXISTS: время страницы списка и COUNT.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Досоздать тестовые рецепты до указанного количества '
+                 '(например, 100000).')
+        parser.add_argument(
+            '--tags', nargs='+',
+            help='Слаги тегов для фильтра (по умолчанию два первых тега).')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнить каждый запрос.')
+        parser.add_argument(
+            '--limit', type=int, default=6,
+            help='Размер страницы.')
+        parser.add_argument(
+            '--explain', action='store_true',
+            help='Вывести EXPLAIN ANALYZE запросов (только PostgreSQL).')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'])
+        slugs = options['tags'] or list(
+            Tag.objects.values_list('slug', flat=True)[:2])
+        if not slugs:
+            raise CommandError('Нет тегов: запустите команду с --seed.')
+        self.stdout.write(
+            f'Рецептов: {Recipe.objects.count()}, теги: {", ".join(slugs)}')
+        for name, plan in PLANS.items():
+            queryset = plan(slugs).order_by('-created_at', '-id')
+            page = queryset.values_list('pk', flat=True)[:options['limit']]
+            timings = {
+                'page': self.measure(lambda: list(page.all()),
+                                     options['repeat']),
+                'count': self.measure(queryset.count, options['repeat']),
+            }
+            for query, (median, p95) in timings.items():
+                self.stdout.write(
+                    f'{name:>8} {query:>5}: медиана {median:.2f} мс, '
+                    f'p95 {p95:.2f} мс')
+            if options['explain'] and connection.vendor == 'postgresql':
+                self.stdout.write(page.explain(analyze=True, buffers=True))
+
+    @staticmethod
+    def measure(query, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return (statistics.median(timings),
+                timings[min(len(timings) - 1, int(len(timings) * 0.95))])
+
+    def seed(self, total, batch_size=5000):
+        missing = total - Recipe.objects.count()
+        if missing <= 0:
+            return
+        started = time.monotonic()
+        author, _ = User.objects.get_or_create(
+            email='bench@foodgram.local',
+            defaults={'username': 'bench', 'first_name': 'Bench',
+                      'last_name': 'Bench'})
+        for slug in BENCH_TAGS:
+            Tag.objects.get_or_create(slug=slug, defaults={'name': slug})
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        recipes = (Recipe(author=author, name=f'Тестовый рецепт {number}',
+                          image='recipes/bench.png', text='Тестовый рецепт.',
+                          cooking_time=random.randint(1, 180))
+                   for number in range(missing))
+        while batch := list(islice(recipes, batch_size)):
+            with transaction.atomic():
+                created = Recipe.objects.bulk_create(batch)
+                RecipeTag.objects.bulk_create(
+                    RecipeTag(recipe_id=recipe.pk, tag_id=tag_id)
+                    for recipe in created
+                    for tag_id in random.sample(
+                        tag_ids, random.randint(1, min(3, len(tag_ids)))))
+        User.objects.filter(pk=author.pk).update(
+            recipes_count=author.recipes.count())
+        bump_model_version(Recipe)
+        self.stdout.write(
+            f'Создано рецептов: {missing}, '
+            f'время {time.monotonic() - started:.2f} с.')
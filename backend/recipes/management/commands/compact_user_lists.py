@@ -0,0 +1,88 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from recipes.services import USER_LISTS
+
+
+class Command(BaseCommand):
+    help = ('Удалить неактивные строки избранного и корзин (снятые флаги) '
+            'небольшими пачками, чтобы не держать блокировки долго.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном DELETE.')
+        parser.add_argument(
+            '--pause', type=float, default=0.1,
+            help='Пауза между пачками, с.')
+        parser.add_argument(
+            '--lock-timeout', type=int, default=1000,
+            help='Сколько ждать блокировку строк, мс (только PostgreSQL). '
+                 'Пачка, не дождавшаяся блокировки, пропускается.')
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help='Выполнить VACUUM (ANALYZE) таблиц после очистки '
+                 '(только PostgreSQL).')
+
+    def handle(self, *args, **options):
+        postgres = connection.vendor == 'postgresql'
+        for model, (flag, _) in USER_LISTS.items():
+            started = time.monotonic()
+            table = connection.ops.quote_name(model._meta.db_table)
+            column = connection.ops.quote_name(flag)
+            size_before = self.get_table_size(table) if postgres else None
+            inactive = model.objects.filter(**{flag: False}).order_by(
+                'pk').values_list('pk', flat=True)
+            deleted = reclaimed = skipped = last_pk = 0
+            while batch := list(inactive.filter(
+                    pk__gt=last_pk)[:options['batch_size']]):
+                last_pk = batch[-1]
+                try:
+                    sizes = self.delete_batch(table, column, batch, postgres,
+                                              options['lock_timeout'])
+                except OperationalError:
+                    skipped += len(batch)
+                    continue
+                deleted += len(sizes)
+                reclaimed += sum(size or 0 for size in sizes)
+                time.sleep(options['pause'])
+            if postgres and options['vacuum']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'VACUUM (ANALYZE) {table}')
+            report = (f'{model._meta.verbose_name_plural}: удалено строк '
+                      f'{deleted}')
+            if postgres:
+                report += (f', освобождено {reclaimed} байт данных строк, '
+                           f'размер таблицы с индексами {size_before} -> '
+                           f'{self.get_table_size(table)} байт')
+            if skipped:
+                report += f', пропущено из-за блокировок {skipped}'
+            self.stdout.write(self.style.SUCCESS(
+                f'{report}. Время {time.monotonic() - started:.2f} с.'))
+
+    @staticmethod
+    def delete_batch(table, column, batch, postgres, lock_timeout):
+        """Delete the batch rows that are still inactive.
+
+        Rows flagged again since they were selected are kept. Inactive
+        rows are invisible to the API, so the raw DELETE skips the
+        per-row delete signals on purpose. Returns the size in bytes of
+        every deleted row on PostgreSQL (None elsewhere).
+        """
+        size = f'pg_column_size({table}.*)' if postgres else 'NULL'
+        with transaction.atomic(), connection.cursor() as cursor:
+            if postgres:
+                cursor.execute(f'SET LOCAL lock_timeout = {int(lock_timeout)}')
+            cursor.execute(
+                f'DELETE FROM {table} '
+                f'WHERE id IN ({", ".join(["%s"] * len(batch))}) '
+                f'AND NOT {column} RETURNING {size}', batch)
+            return [row_size for row_size, in cursor.fetchall()]
+
+    @staticmethod
+    def get_table_size(table):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+            return cursor.fetchone()[0]
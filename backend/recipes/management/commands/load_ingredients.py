@@ -0,0 +1,76 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Ingredient
+from recipes.services import bump_model_version
+
+
+def read_csv_ingredients(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_json_ingredients(file):
+    for ingredient in json.load(file):
+        yield ingredient.get('name'), ingredient.get('measurement_unit')
+
+
+READERS = {
+    '.csv': read_csv_ingredients,
+    '.json': read_json_ingredients,
+}
+
+
+class Command(BaseCommand):
+    help = ('Загрузить ингредиенты из csv или json. Существующие '
+            'ингредиенты пропускаются, поэтому команду можно запускать '
+            'при каждом деплое.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=settings.BASE_DIR / 'data' / 'ingredients.csv',
+            help='Путь к файлу ингредиентов (.csv или .json).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(f'Неподдерживаемый формат файла: {path}')
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+        started = time.monotonic()
+        read = 0
+        seen = set()
+
+        def unique_ingredients(rows):
+            nonlocal read
+            for name, measurement_unit in rows:
+                read += 1
+                key = ((name or '').strip(), (measurement_unit or '').strip())
+                if all(key) and key not in seen:
+                    seen.add(key)
+                    yield Ingredient(name=key[0], measurement_unit=key[1])
+
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            before = Ingredient.objects.count()
+            ingredients = unique_ingredients(reader(file))
+            while batch := list(islice(ingredients, options['batch_size'])):
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            created = Ingredient.objects.count() - before
+        bump_model_version(Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {read}, уникальных: {len(seen)}, '
+            f'добавлено: {created}, уже были: {len(seen) - created}. '
+            f'Время: {time.monotonic() - started:.2f} с.'))
@@ -0,0 +1,64 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follows
+
+User = get_user_model()
+
+
+def count_of(queryset, field):
+    """Correlated COUNT of queryset rows whose field points at the row."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(count=Count('pk')).values('count')), 0)
+
+
+COUNTERS = (
+    (Recipe, {
+        'favorites_count': count_of(
+            Favorite.objects.filter(is_favorited=True), 'recipe'),
+        'in_carts_count': count_of(
+            ShoppingCart.objects.filter(is_in_shopping_cart=True), 'recipe'),
+    }),
+    (User, {
+        'recipes_count': count_of(Recipe.objects.all(), 'author'),
+        'followers_count': count_of(Follows.objects.all(), 'following'),
+    }),
+)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать хранимые счётчики избранного, корзин, рецептов '
+            'и подписчиков там, где они разошлись с данными.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном UPDATE.')
+
+    def handle(self, *args, **options):
+        for model, counters in COUNTERS:
+            started = time.monotonic()
+            actual = {f'actual_{field}': count
+                      for field, count in counters.items()}
+            drifted = model.objects.annotate(**actual).exclude(
+                **{field: F(f'actual_{field}') for field in counters}
+            ).order_by('pk').values_list('pk', *actual)
+            repaired = last_pk = 0
+            while batch := list(drifted.filter(
+                    pk__gt=last_pk)[:options['batch_size']]):
+                instances = [model(pk=pk, **dict(zip(counters, values)))
+                             for pk, *values in batch]
+                with transaction.atomic():
+                    model.objects.bulk_update(instances, counters)
+                repaired += len(instances)
+                last_pk = batch[-1][0]
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: исправлено '
+                f'{repaired}, время {time.monotonic() - started:.2f} с.'))
@@ -0,0 +1,242 @@
+import random
+import time
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from PIL import Image
+
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            RecipeTag, ShoppingCart, Tag)
+from recipes.renditions import create_renditions
+from recipes.services import bump_model_version
+from users.models import Follows
+
+User = get_user_model()
+
+SEED_DOMAIN = 'seed.foodgram.local'
+SEED_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'),
+    ('Выпечка', 'bakery'),
+    ('Вегетарианское', 'vegetarian'),
+    ('Быстро', 'quick'),
+    ('Праздничное', 'holiday'),
+)
+PLACEHOLDERS = {
+    'image': 'recipes/seed-placeholder.png',
+    'avatar': 'avatars/seed-placeholder.png',
+}
+WORDS = ('суп', 'салат', 'пирог', 'рагу', 'запеканка', 'каша', 'паста',
+         'омлет', 'котлеты', 'плов', 'блины', 'борщ', 'сырники', 'ризотто')
+
+
+class ZipfSampler:
+    """Draw ranks 0..n-1 with P(rank) proportional to 1 / (rank + 1)^s."""
+
+    def __init__(self, rng, size, exponent):
+        self.rng = rng
+        self.population = range(size)
+        self.cum_weights = list(accumulate(
+            1 / (rank + 1) ** exponent for rank in range(size)))
+
+    def sample(self, count, exclude=None):
+        """Up to count distinct ranks."""
+        picked = set()
+        for _ in range(count * 3):
+            if len(picked) >= count:
+                break
+            rank = self.rng.choices(
+                self.population, cum_weights=self.cum_weights)[0]
+            if rank != exclude:
+                picked.add(rank)
+        return picked
+
+
+class Command(BaseCommand):
+    help = ('Сгенерировать детерминированный набор данных для нагрузочного '
+            'тестирования: пользователей, рецепты, избранное, корзины и '
+            'подписки с популярностью по закону Ципфа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--recipes', type=int, default=200000)
+        parser.add_argument(
+            '--favorites', type=float, default=30,
+            help='Среднее число рецептов в избранном у пользователя.')
+        parser.add_argument(
+            '--carts', type=float, default=5,
+            help='Среднее число рецептов в корзине у пользователя.')
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='Среднее число подписок у пользователя.')
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель степени распределения популярности.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Количество строк в одном INSERT.')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Сначала удалить данные предыдущей генерации.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        if options['clear']:
+            self.step('Удаление прошлой генерации', self.clear)
+        elif User.objects.filter(email__endswith=f'@{SEED_DOMAIN}').exists():
+            raise CommandError('Данные уже сгенерированы, запустите '
+                               'команду с --clear.')
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET synchronous_commit TO OFF')
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', stdout=self.stdout)
+        self.make_placeholders()
+        for name, slug in SEED_TAGS:
+            Tag.objects.get_or_create(slug=slug, defaults={'name': name})
+        user_ids = self.step('Пользователи', self.create_users,
+                             options['users'])
+        recipe_ids = self.step('Рецепты', self.create_recipes, user_ids,
+                               options['recipes'], options['zipf'])
+        for model, flag, mean in (
+                (Favorite, 'is_favorited', options['favorites']),
+                (ShoppingCart, 'is_in_shopping_cart', options['carts'])):
+            self.step(model._meta.verbose_name_plural, self.create_lists,
+                      model, flag, user_ids, recipe_ids, mean,
+                      options['zipf'])
+        self.step('Подписки', self.create_follows, user_ids,
+                  options['follows'], options['zipf'])
+        call_command('recount', stdout=self.stdout)
+        call_command('update_search_vectors', stdout=self.stdout)
+        for model in (Tag, Recipe, Ingredient):
+            bump_model_version(model)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с.'))
+
+    def step(self, title, function, *args):
+        started = time.monotonic()
+        result = function(*args)
+        self.stdout.write(f'{title}: {time.monotonic() - started:.1f} с.')
+        return result
+
+    def bulk_create(self, model, rows):
+        """Insert rows in batches; return the ids of the created rows."""
+        created = []
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+                created.extend(
+                    row.pk for row in model.objects.bulk_create(batch))
+        return created
+
+    def clear(self):
+        """Delete the previous generation with plain DELETEs.
+
+        Going through the ORM would load millions of rows to send
+        delete signals that only bump cache stamps.
+        """
+        table = connection.ops.quote_name
+        users = (f'SELECT id FROM {table(User._meta.db_table)} '
+                 f'WHERE email LIKE %s')
+        recipes = (f'SELECT id FROM {table(Recipe._meta.db_table)} '
+                   f'WHERE author_id IN ({users})')
+        pattern = f'%@{SEED_DOMAIN}'
+        deletes = (
+            (Favorite, f'user_id IN ({users}) OR recipe_id IN ({recipes})'),
+            (ShoppingCart,
+             f'user_id IN ({users}) OR recipe_id IN ({recipes})'),
+            (Follows, f'user_id IN ({users}) OR following_id IN ({users})'),
+            (RecipeTag, f'recipe_id IN ({recipes})'),
+            (IngredientRecipe, f'recipe_id IN ({recipes})'),
+            (Recipe, f'author_id IN ({users})'),
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model, condition in deletes:
+                cursor.execute(
+                    f'DELETE FROM {table(model._meta.db_table)} '
+                    f'WHERE {condition}',
+                    [pattern] * condition.count('%s'))
+        User.objects.filter(email__endswith=f'@{SEED_DOMAIN}').delete()
+
+    def make_placeholders(self):
+        """One shared picture (and its renditions) per image field."""
+        for name in PLACEHOLDERS.values():
+            if default_storage.exists(name):
+                continue
+            buffer = BytesIO()
+            Image.new('RGB', (1200, 900), (230, 160, 90)).save(
+                buffer, format='PNG')
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+            create_renditions(Recipe(image=name).image)
+
+    def create_users(self, count):
+        password = make_password(None)
+        return self.bulk_create(User, (
+            User(email=f'user{number}@{SEED_DOMAIN}',
+                 username=f'seed-user-{number}',
+                 first_name='Пользователь', last_name=str(number),
+                 password=password, avatar=PLACEHOLDERS['avatar'])
+            for number in range(count)))
+
+    def create_recipes(self, user_ids, count, exponent):
+        authors = ZipfSampler(self.rng, len(user_ids), exponent)
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        recipe_ids = []
+        for offset in range(0, count, self.batch_size):
+            created = self.bulk_create(Recipe, (
+                Recipe(author_id=user_ids[authors.sample(1).pop()],
+                       name=(f'{self.rng.choice(WORDS).capitalize()} '
+                             f'№{number}'),
+                       text=' '.join(self.rng.choices(WORDS, k=40)),
+                       image=PLACEHOLDERS['image'],
+                       cooking_time=self.rng.randint(5, 180))
+                for number in range(
+                    offset, min(count, offset + self.batch_size))))
+            self.bulk_create(IngredientRecipe, (
+                IngredientRecipe(recipe_id=recipe_id, ingredient_id=pk,
+                                 amount=self.rng.randint(1, 500))
+                for recipe_id in created
+                for pk in self.rng.sample(ingredient_ids, min(
+                    len(ingredient_ids), self.rng.randint(3, 10)))))
+            self.bulk_create(RecipeTag, (
+                RecipeTag(recipe_id=recipe_id, tag_id=pk)
+                for recipe_id in created
+                for pk in self.rng.sample(tag_ids, self.rng.randint(1, 3))))
+            recipe_ids.extend(created)
+        return recipe_ids
+
+    def activity(self, mean):
+        """How many rows one user gets: most have few, some have many."""
+        return int(self.rng.expovariate(1 / mean)) if mean else 0
+
+    def create_lists(self, model, flag, user_ids, recipe_ids, mean,
+                     exponent):
+        recipes = ZipfSampler(self.rng, len(recipe_ids), exponent)
+        self.bulk_create(model, (
+            model(user_id=user_id, recipe_id=recipe_ids[rank], **{flag: True})
+            for user_id in user_ids
+            for rank in recipes.sample(self.activity(mean))))
+
+    def create_follows(self, user_ids, mean, exponent):
+        authors = ZipfSampler(self.rng, len(user_ids), exponent)
+        self.bulk_create(Follows, (
+            Follows(user_id=user_id, following_id=user_ids[rank])
+            for position, user_id in enumerate(user_ids)
+            for rank in authors.sample(self.activity(mean),
+                                       exclude=position)))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.search import full_text_supported, update_search_vector
+from recipes.services import bump_model_version
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать поисковые векторы рецептов, например после '
+            'миграции или массовой загрузки через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одном UPDATE.')
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Только рецепты без вектора.')
+
+    def handle(self, *args, **options):
+        if not full_text_supported():
+            self.stdout.write('Полнотекстовый поиск доступен только '
+                              'на PostgreSQL, пересчитывать нечего.')
+            return
+        started = time.monotonic()
+        recipes = Recipe.objects.order_by('pk')
+        if options['missing']:
+            recipes = recipes.filter(search_vector__isnull=True)
+        updated = last_pk = 0
+        while batch := list(recipes.filter(pk__gt=last_pk).values_list(
+                'pk', flat=True)[:options['batch_size']]):
+            updated += update_search_vector(
+                Recipe.objects.filter(pk__in=batch))
+            last_pk = batch[-1]
+        if updated:
+            bump_model_version(Recipe)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: {updated}. '
+            f'Время: {time.monotonic() - started:.2f} с.'))
@@ -1,9 +1,13 @@
 import uuid
 
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Exists, OuterRef, Prefetch, Q, Value
 from django.core.validators import validate_slug, MinValueValidator
 
+from recipes.search import SearchVectorIndex
+
 User = get_user_model()
 
 
@@ -16,6 +20,11 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_measurement_unit'),
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -38,6 +47,38 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user):
+        """Annotate is_favorited and is_in_shopping_cart for the user."""
+        if not user.is_authenticated:
+            return self.annotate(is_favorited=Value(False),
+                                 is_in_shopping_cart=Value(False))
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                recipe=OuterRef('pk'), user=user, is_favorited=True)),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                recipe=OuterRef('pk'), user=user, is_in_shopping_cart=True))
+        )
+
+    def for_representation(self, user):
+        """Load all RecipeSerializer renders in a fixed number of queries."""
+        return self.with_user_flags(user).prefetch_related(
+            Prefetch('author',
+                     queryset=User.objects.with_is_subscribed(user)),
+            'tags',
+            Prefetch('recipe_ingredients',
+                     queryset=IngredientRecipe.objects.select_related(
+                         'ingredient').order_by('ingredient__name'))
+        )
+
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+    def get_queryset(self):
+        """The stored search vector is only read by the database."""
+        return super().get_queryset().defer('search_vector')
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                verbose_name='Автор', related_name='recipes')
@@ -54,25 +95,40 @@ class Recipe(models.Model):
     cooking_time = models.PositiveSmallIntegerField(
         blank=False, null=False, verbose_name='Время приготовления',
         validators=(MinValueValidator(1, message='Время приготовления должно'
-                                              ' быть больше или равно 1')),)
+                                              ' быть больше или равно 1'),))
     unique_uuid = models.UUIDField(
         primary_key=False, default=uuid.uuid4,
         editable=False, verbose_name='Уникальный uuid',
         unique=True)
     created_at = models.DateTimeField(auto_now_add=True,
                                       verbose_name='Добавлено')
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном')
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В корзинах')
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name='Поисковый вектор')
+
+    objects = RecipeManager()
 
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=('-created_at', '-id'),
+                         name='recipe_created_at_id'),
+            SearchVectorIndex(fields=('search_vector',),
+                              name='recipe_search_vector'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
-    @property
-    def is_favorited_count(self):
-        return self.favorite_recipes.filter(is_favorited=True).count()
+
+# The through table Django creates for Recipe.tags. Its unique
+# (recipe_id, tag_id) index answers the EXISTS probe of the tag filter.
+RecipeTag = Recipe.tags.through
 
 
 class IngredientRecipe(models.Model):
@@ -122,6 +178,11 @@ class Favorite(FavoriteShoppingCartBaseModel):
 
     class Meta(FavoriteShoppingCartBaseModel.Meta):
         ordering = ('user',)
+        indexes = [
+            models.Index(fields=('user', 'recipe'),
+                         condition=Q(is_favorited=True),
+                         name='favorite_active_user_recipe'),
+        ]
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
 
@@ -135,8 +196,27 @@ class ShoppingCart(FavoriteShoppingCartBaseModel):
 
     class Meta(FavoriteShoppingCartBaseModel.Meta):
         ordering = ('user',)
+        indexes = [
+            models.Index(fields=('user', 'recipe'),
+                         condition=Q(is_in_shopping_cart=True),
+                         name='cart_active_user_recipe'),
+        ]
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзина'
 
     def __str__(self):
         return f'Корзина {self.user} с рецептом "{self.recipe}"'
+
+
+class Version(models.Model):
+    """Stamp of the last change of a model, see recipes.services."""
+    key = models.CharField(max_length=100, primary_key=True,
+                           verbose_name='Ключ')
+    stamp = models.BigIntegerField(verbose_name='Изменено, нс')
+
+    class Meta:
+        verbose_name = 'Версия'
+        verbose_name_plural = 'Версии'
+
+    def __str__(self):
+        return f'{self.key}: {self.stamp}'
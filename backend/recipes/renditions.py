@@ -0,0 +1,84 @@
+import logging
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumb': (160, 160),
+    'card': (480, 480),
+    'large': (1200, 1200),
+}
+WEBP = 'WEBP'
+SAVE_OPTIONS = {
+    WEBP: {'quality': 80, 'method': 4},
+}
+
+
+def get_rendition_name(name, size, image_format=None):
+    """Rendition path next to the original: recipes/x.png -> x.card.png."""
+    path = PurePosixPath(name)
+    suffix = '.webp' if image_format == WEBP else path.suffix
+    return str(path.with_name(f'{path.stem}.{size}{suffix}'))
+
+
+def get_rendition(image, size, image_format=None):
+    """Return the rendition of an image field file, or the original.
+
+    Falls back to the original while the rendition has not been made yet.
+    """
+    if not image or size not in RENDITIONS:
+        return image
+    if image_format is not None:
+        image_format = image_format.upper()
+    name = get_rendition_name(image.name, size, image_format)
+    if not image.storage.exists(name):
+        return image
+    return type(image)(image.instance, image.field, name)
+
+
+def save_image(storage, name, picture, image_format, **options):
+    buffer = BytesIO()
+    picture.save(buffer, format=image_format, **options)
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def create_renditions(image, force=False):
+    """Write every size of the image in its own format and as WebP.
+
+    Returns the number of files written.
+    """
+    if not image:
+        return 0
+    storage = image.storage
+    try:
+        with storage.open(image.name, 'rb') as file:
+            original = Image.open(file)
+            image_format = original.format
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning('Cannot make renditions of %s', image.name)
+        return 0
+    if image_format == 'JPEG' and original.mode not in ('RGB', 'L'):
+        original = original.convert('RGB')
+    written = 0
+    for size, box in RENDITIONS.items():
+        names = {
+            image_format: get_rendition_name(image.name, size),
+            WEBP: get_rendition_name(image.name, size, WEBP),
+        }
+        if not force and all(map(storage.exists, names.values())):
+            continue
+        picture = original.copy()
+        picture.thumbnail(box, Image.LANCZOS)
+        for target_format, name in names.items():
+            save_image(storage, name, picture, target_format,
+                       **SAVE_OPTIONS.get(target_format, {'optimize': True}))
+            written += 1
+    return written
@@ -0,0 +1,54 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import Case, F, Index, Q, Value, When
+
+SEARCH_CONFIG = 'russian'
+SEARCH_FIELDS = ('name', 'text')
+
+
+def full_text_supported():
+    return connection.vendor == 'postgresql'
+
+
+class SearchVectorIndex(GinIndex):
+    """GIN index on PostgreSQL, a plain index on SQLite test runs."""
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return Index.create_sql(self, model, schema_editor, using=using,
+                                    **kwargs)
+        return super().create_sql(model, schema_editor, using=using,
+                                  **kwargs)
+
+
+def recipe_search_vector():
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG))
+
+
+def update_search_vector(queryset):
+    """Recompute the stored search vector of the recipes in queryset."""
+    if full_text_supported():
+        return queryset.update(search_vector=recipe_search_vector())
+    return 0
+
+
+def search_recipes(queryset, query):
+    """Recipes matching the query, best matches first.
+
+    PostgreSQL ranks the stored vector with SearchRank. Elsewhere the
+    query is matched as a substring and name matches come first.
+    """
+    if not full_text_supported():
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(rank=Case(When(name__icontains=query, then=Value(1.0)),
+                             default=Value(0.5))
+                   ).order_by('-rank', '-created_at', '-id')
+    search_query = SearchQuery(query, config=SEARCH_CONFIG,
+                               search_type='websearch')
+    return queryset.filter(search_vector=search_query).annotate(
+        rank=SearchRank(F('search_vector'), search_query)
+    ).order_by('-rank', '-created_at', '-id')
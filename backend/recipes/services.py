@@ -1,36 +1,249 @@
 import csv
 import json
+import time
 
-from django.http import HttpResponse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.http import StreamingHttpResponse
 
+from recipes.models import (Favorite, IngredientRecipe, Recipe, ShoppingCart,
+                            Tag, Version)
 
-def write_ingredients_to_csv(ingredients):
-    """Write ingredients to scv when downloading."""
-    response = HttpResponse(
-        content_type='text/csv',
+User = get_user_model()
+
+SHOPPING_CART_HEADERS = ('Ингредиенты', 'Единица измерения', 'Кол-во')
+SHOPPING_CART_FIELDS = ('ingredient_name', 'ingredient_unit', 'amount__sum')
+
+
+class Echo:
+    """File-like object that hands back what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_ingredients_csv(ingredients):
+    """Yield the shopping cart as csv lines."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(SHOPPING_CART_HEADERS)
+    for ingredient in ingredients:
+        yield writer.writerow(
+            [ingredient[field] for field in SHOPPING_CART_FIELDS])
+
+
+def iter_ingredients_txt(ingredients):
+    """Yield the shopping cart as plain text lines."""
+    for ingredient in ingredients:
+        name, unit, amount = (
+            ingredient[field] for field in SHOPPING_CART_FIELDS)
+        yield f'{name} ({unit}) — {amount}\n'
+
+
+def iter_ingredients_json(ingredients):
+    """Yield the shopping cart as a json array, one object at a time."""
+    separator = '['
+    for ingredient in ingredients:
+        name, unit, amount = (
+            ingredient[field] for field in SHOPPING_CART_FIELDS)
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': unit, 'amount': amount},
+            ensure_ascii=False)
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+SHOPPING_CART_EXPORTS = {
+    'csv': (iter_ingredients_csv, 'text/csv'),
+    'txt': (iter_ingredients_txt, 'text/plain'),
+    'json': (iter_ingredients_json, 'application/json'),
+}
+
+
+def stream_ingredients(ingredients, export_format='csv'):
+    """Stream the shopping cart in csv, txt or json when downloading."""
+    write_ingredients, content_type = SHOPPING_CART_EXPORTS[export_format]
+    return StreamingHttpResponse(
+        write_ingredients(ingredients),
+        content_type=f'{content_type}; charset=utf-8',
         headers={'Content-Disposition':
-                     'attachment; filename="my-shopping-cart.csv"'},
+                 'attachment; '
+                 f'filename="my-shopping-cart.{export_format}"'},
     )
-    headers = ('Ингредиенты', 'Единица измерения', 'Кол-во')
-    writer_headers = csv.writer(response)
-    writer_headers.writerow(headers)
-    writer = csv.DictWriter(response, fieldnames=ingredients[0].keys())
-    writer.writerows(ingredients)
-    return response
-
-
-def load_json_ingredients(json_data_file):
-    """Load json data."""
-    with open(json_data_file) as json_file:
-
-        file = json.load(json_file)
-        data = [
-            {'model': 'recipes.ingredient', 'pk': pk + 1,
-             'fields': {
-                 'name': instance.get('name'),
-                 'measurement_unit': instance.get('measurement_unit')}
-             }
-            for pk, instance in enumerate(file)
-        ]
-        output_json = open('ingredients_test_1.json', 'w', encoding='utf-8')
-        json.dump(data, output_json, ensure_ascii=False, indent=4)
+
+
+def get_versions(keys):
+    """Return the version stamps of keys in one query.
+
+    A stamp is the time of the last change in nanoseconds, so it doubles
+    as the Last-Modified value of whatever it versions. Stamps are rows
+    of the Version table: every worker, the job runner and management
+    commands see them, a bump anywhere invalidates everywhere, and a
+    bump made in a transaction shows only once the change is committed.
+    """
+    stamps = dict(Version.objects.filter(key__in=keys).values_list(
+        'key', 'stamp'))
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        Version.objects.bulk_create(
+            [Version(key=key, stamp=time.time_ns()) for key in missing],
+            ignore_conflicts=True)
+        stamps.update(Version.objects.filter(key__in=missing).values_list(
+            'key', 'stamp'))
+    return [stamps[key] for key in keys]
+
+
+def bump_version(key):
+    """Invalidate everything built under the version stamp."""
+    Version.objects.bulk_create(
+        [Version(key=key, stamp=time.time_ns())], update_conflicts=True,
+        unique_fields=('key',), update_fields=('stamp',))
+
+
+def get_model_versions(models):
+    if not models:
+        return []
+    return get_versions([model._meta.label_lower for model in models])
+
+
+def get_model_version(model):
+    return get_model_versions((model,))[0]
+
+
+def bump_model_version(model):
+    bump_version(model._meta.label_lower)
+
+
+def get_tag_ids(slugs):
+    """Resolve tag slugs to ids, dropping unknown ones.
+
+    The slug -> id map is cached under the Tag version stamp, so it is
+    rebuilt after any tag changes.
+    """
+    tag_ids = cache.get_or_set(
+        f'tag-ids:{get_model_version(Tag)}',
+        lambda: dict(Tag.objects.values_list('slug', 'id')))
+    return [tag_ids[slug] for slug in slugs if slug in tag_ids]
+
+
+def get_user_version(user):
+    """Return the stamp of the user's favorites, cart and follows.
+
+    It is a column of the user row, so the authenticated user already
+    carries it.
+    """
+    return user.lists_version
+
+
+def bump_user_version(user_id):
+    User.objects.filter(pk=user_id).update(lists_version=time.time_ns())
+
+
+def change_counter(queryset, field, delta):
+    """Shift a stored counter in the database without reading it first.
+
+    Counters never go below zero, so a counter that drifted low (until
+    the next recount) cannot break the CHECK constraint on decrement.
+    """
+    value = F(field) + delta
+    if delta < 0:
+        value = Greatest(value, 0)
+    return queryset.update(**{field: value})
+
+
+def sync_recipe_ingredients(recipe, amounts):
+    """Bring the recipe ingredients to amounts, {ingredient_id: amount}.
+
+    Only the difference is written: one DELETE for dropped (and
+    duplicated) rows, one bulk UPDATE for changed amounts and one bulk
+    INSERT for new ingredients, each skipped when there is nothing to
+    do. Returns whether anything was written.
+    """
+    kept, stale = {}, []
+    for row in IngredientRecipe.objects.filter(recipe=recipe).only(
+            'ingredient_id', 'amount').order_by('pk'):
+        if row.ingredient_id in amounts and row.ingredient_id not in kept:
+            kept[row.ingredient_id] = row
+        else:
+            stale.append(row.pk)
+    changed = []
+    for ingredient_id, row in kept.items():
+        if row.amount != amounts[ingredient_id]:
+            row.amount = amounts[ingredient_id]
+            changed.append(row)
+    added = [IngredientRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                              amount=amount)
+             for ingredient_id, amount in amounts.items()
+             if ingredient_id not in kept]
+    if stale:
+        IngredientRecipe.objects.filter(pk__in=stale).delete()
+    if changed:
+        IngredientRecipe.objects.bulk_update(changed, ('amount',))
+    if added:
+        IngredientRecipe.objects.bulk_create(added)
+    return bool(stale or changed or added)
+
+
+USER_LISTS = {
+    Favorite: ('is_favorited', 'favorites_count'),
+    ShoppingCart: ('is_in_shopping_cart', 'in_carts_count'),
+}
+
+
+def toggle_user_list(model, user_id, recipe_ids, active):
+    """Add recipes to (or remove them from) the user's favorites or cart.
+
+    The flag is flipped with a single INSERT ... ON CONFLICT DO UPDATE
+    (or UPDATE) ... RETURNING, which only returns rows whose flag
+    actually changed, so "already there" needs no separate lookup. The
+    recipe counters of those rows are shifted (never below zero) by one
+    more statement that returns the fields of the short recipe
+    representation.
+
+    Returns the changed recipes. Raises Recipe.DoesNotExist if any
+    recipe is missing.
+    """
+    flag, counter = USER_LISTS[model]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    recipe_ids = list(dict.fromkeys(map(int, recipe_ids)))
+    if not recipe_ids:
+        return []
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with transaction.atomic(), connection.cursor() as cursor:
+        if active:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, recipe_id, {quote(flag)}) '
+                f'VALUES {", ".join(["(%s, %s, TRUE)"] * len(recipe_ids))} '
+                f'ON CONFLICT (user_id, recipe_id) DO UPDATE '
+                f'SET {quote(flag)} = TRUE '
+                f'WHERE NOT {table}.{quote(flag)} '
+                f'RETURNING recipe_id',
+                [value for recipe_id in recipe_ids
+                 for value in (user_id, recipe_id)])
+        else:
+            cursor.execute(
+                f'UPDATE {table} SET {quote(flag)} = FALSE '
+                f'WHERE user_id = %s AND recipe_id IN ({placeholders}) '
+                f'AND {quote(flag)} RETURNING recipe_id',
+                [user_id, *recipe_ids])
+        changed = [recipe_id for recipe_id, in cursor.fetchall()]
+        if not changed:
+            return []
+        delta = 1 if active else -1
+        cursor.execute(
+            f'UPDATE {quote(Recipe._meta.db_table)} '
+            f'SET {quote(counter)} = CASE WHEN {quote(counter)} + %s > 0 '
+            f'THEN {quote(counter)} + %s ELSE 0 END '
+            f'WHERE id IN ({", ".join(["%s"] * len(changed))}) '
+            f'RETURNING id, name, image, cooking_time',
+            [delta, delta, *changed])
+        recipes = [Recipe(id=pk, name=name, image=image,
+                          cooking_time=cooking_time)
+                   for pk, name, image, cooking_time in cursor.fetchall()]
+        if len(recipes) != len(changed):
+            raise Recipe.DoesNotExist
+    bump_user_version(user_id)
+    return recipes
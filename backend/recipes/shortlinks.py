@@ -0,0 +1,143 @@
+import string
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from recipes.models import Recipe
+
+ALPHABET = string.digits + string.ascii_lowercase + string.ascii_uppercase
+BASE = len(ALPHABET)
+CODE_PATTERN = '[0-9a-zA-Z]{1,11}'
+MAX_ID = 2 ** 63 - 1
+
+
+def encode_id(number):
+    """Recipe id -> base62 short code: 125 -> '21'."""
+    code = ''
+    while True:
+        number, remainder = divmod(number, BASE)
+        code = ALPHABET[remainder] + code
+        if not number:
+            return code
+
+
+def decode_code(code):
+    """Base62 short code -> recipe id."""
+    number = 0
+    for char in code:
+        number = number * BASE + ALPHABET.index(char)
+    return number
+
+
+class ShortLinkResolver:
+    """Map short link keys (base62 codes and old uuids) to recipe ids.
+
+    Lookups go through a bounded per-process LRU, then through the
+    optional shared cache SHORT_LINK_CACHE, and only then to the
+    database, so a burst of hits on one link costs a single query.
+    Missing recipes are not remembered.
+    """
+
+    def __init__(self, maxsize=None, cache_alias=None):
+        self.maxsize = maxsize or settings.SHORT_LINK_LRU_SIZE
+        self.cache_alias = cache_alias or settings.SHORT_LINK_CACHE
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def get_local(self, key):
+        with self.lock:
+            recipe_id = self.entries.get(key)
+            if recipe_id is not None:
+                self.entries.move_to_end(key)
+            return recipe_id
+
+    def get(self, key):
+        recipe_id = self.get_local(key)
+        if recipe_id is None and self.shared is not None:
+            recipe_id = self.shared.get(f'short-link:{key}')
+            if recipe_id is not None:
+                self.remember(key, recipe_id, shared=False)
+        return recipe_id
+
+    def remember(self, key, recipe_id, shared=True):
+        with self.lock:
+            self.entries[key] = recipe_id
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        if shared and self.shared is not None:
+            self.shared.set(f'short-link:{key}', recipe_id)
+
+    def forget(self, recipe):
+        keys = (encode_id(recipe.pk), str(recipe.unique_uuid))
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete_many([f'short-link:{key}' for key in keys])
+
+    def resolve(self, key, **lookup):
+        recipe_id = self.get(key)
+        if recipe_id is None:
+            recipe_id = Recipe.objects.filter(**lookup).values_list(
+                'pk', flat=True).first()
+            if recipe_id is not None:
+                self.remember(key, recipe_id)
+        return recipe_id
+
+    async def aresolve(self, key, **lookup):
+        """resolve() for async views."""
+        recipe_id = self.get_local(key)
+        if recipe_id is None and self.shared is not None:
+            recipe_id = await self.shared.aget(f'short-link:{key}')
+            if recipe_id is not None:
+                self.remember(key, recipe_id, shared=False)
+        if recipe_id is None:
+            recipe_id = await Recipe.objects.filter(**lookup).values_list(
+                'pk', flat=True).afirst()
+            if recipe_id is not None:
+                self.remember(key, recipe_id, shared=False)
+                if self.shared is not None:
+                    await self.shared.aset(f'short-link:{key}', recipe_id)
+        return recipe_id
+
+    @staticmethod
+    def parse_code(code):
+        """Recipe id of a canonical code, None for any other spelling."""
+        recipe_id = decode_code(code)
+        if recipe_id > MAX_ID or encode_id(recipe_id) != code:
+            return None
+        return recipe_id
+
+    def resolve_code(self, code):
+        """Return the id of the recipe behind the code, or None."""
+        recipe_id = self.parse_code(code)
+        if recipe_id is None:
+            return None
+        return self.resolve(code, pk=recipe_id)
+
+    async def aresolve_code(self, code):
+        recipe_id = self.parse_code(code)
+        if recipe_id is None:
+            return None
+        return await self.aresolve(code, pk=recipe_id)
+
+    def resolve_uuid(self, recipe_uuid):
+        """Return the id of the recipe behind the old uuid link, or None."""
+        return self.resolve(str(recipe_uuid), unique_uuid=recipe_uuid)
+
+    async def aresolve_uuid(self, recipe_uuid):
+        return await self.aresolve(str(recipe_uuid), unique_uuid=recipe_uuid)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+short_links = ShortLinkResolver()
@@ -0,0 +1,148 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Tag)
+from recipes.search import SEARCH_FIELDS, update_search_vector
+from recipes.services import (bump_model_version, bump_user_version,
+                              change_counter)
+from recipes.shortlinks import short_links
+from recipes.tasks import make_renditions
+from users.models import Follows
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Recipe)
+def bump_catalogue_version(sender, **kwargs):
+    bump_model_version(sender)
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_version(sender, **kwargs):
+    bump_model_version(Recipe)
+
+
+@receiver((post_save, post_delete), sender=User)
+def bump_author_version(sender, update_fields=None, **kwargs):
+    """Recipes embed their author, but logins only touch last_login."""
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_model_version(Recipe)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follows)
+def bump_owner_version(sender, instance, **kwargs):
+    bump_user_version(instance.user_id)
+
+
+COUNTERS = {
+    Recipe: ('author', None, 'recipes_count'),
+    Follows: ('following', None, 'followers_count'),
+    Favorite: ('recipe', 'is_favorited', 'favorites_count'),
+    ShoppingCart: ('recipe', 'is_in_shopping_cart', 'in_carts_count'),
+}
+
+
+def get_counted_fields(sender):
+    field, flag, _ = COUNTERS[sender]
+    return (f'{field}_id', flag) if flag else (f'{field}_id',)
+
+
+def get_counted_pk(sender, row):
+    """Pk of the row whose stored counter row (an instance) adds to."""
+    field, *flag = get_counted_fields(sender)
+    if flag and not getattr(row, flag[0]):
+        return None
+    return getattr(row, field)
+
+
+def shift_counter(sender, pk, delta):
+    field, _, counter = COUNTERS[sender]
+    if pk is not None:
+        change_counter(sender._meta.get_field(field).related_model.objects
+                       .filter(pk=pk), counter, delta)
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=Follows)
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+def remember_counted_pk(sender, instance, update_fields=None, **kwargs):
+    """Read what an updated row counted towards before the save.
+
+    Saves that cannot move the row (inserts, update_fields without the
+    counted fields, such as a recipe PATCH) cost no query.
+    """
+    fields = get_counted_fields(sender)
+    names = {*fields, COUNTERS[sender][0]}
+    if instance.pk is None:
+        instance._counted_pk = None
+    elif update_fields is not None and not names & set(update_fields):
+        instance._counted_pk = get_counted_pk(sender, instance)
+    else:
+        row = sender.objects.filter(pk=instance.pk).only(*fields).first()
+        instance._counted_pk = row and get_counted_pk(sender, row)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Follows)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def count_saved_row(sender, instance, raw=False, **kwargs):
+    """Keep stored counters right for admin and ORM writes too.
+
+    toggle_user_list writes the lists with SQL and shifts the counters
+    itself; recount repairs what bulk operations leave behind.
+    """
+    previous = instance.__dict__.pop('_counted_pk', None)
+    current = get_counted_pk(sender, instance)
+    if not raw and previous != current:
+        shift_counter(sender, previous, -1)
+        shift_counter(sender, current, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Follows)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def count_deleted_row(sender, instance, **kwargs):
+    shift_counter(sender, get_counted_pk(sender, instance), -1)
+
+
+IMAGE_FIELDS = {
+    Recipe: 'image',
+    User: 'avatar',
+}
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def mark_uploaded_image(sender, instance, **kwargs):
+    image = getattr(instance, IMAGE_FIELDS[sender])
+    instance._image_uploaded = bool(image) and not image._committed
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def queue_uploaded_image_renditions(sender, instance, **kwargs):
+    if getattr(instance, '_image_uploaded', False):
+        make_renditions.delay(
+            sender._meta.label, instance.pk, IMAGE_FIELDS[sender])
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_short_links(sender, instance, **kwargs):
+    short_links.forget(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) & set(SEARCH_FIELDS):
+        update_search_vector(Recipe.objects.filter(pk=instance.pk))
@@ -0,0 +1,18 @@
+from django.apps import apps
+
+from jobs.services import background
+from recipes.models import Recipe
+from recipes.renditions import create_renditions
+from recipes.services import bump_model_version
+
+
+@background()
+def make_renditions(model_label, pk, field):
+    """Write the renditions of an uploaded recipe photo or avatar.
+
+    Recipe bodies (with their authors' avatars) cached before the files
+    existed link the original, so new renditions bump the Recipe stamp.
+    """
+    instance = apps.get_model(model_label).objects.filter(pk=pk).first()
+    if instance is not None and create_renditions(getattr(instance, field)):
+        bump_model_version(Recipe)
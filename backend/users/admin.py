@@ -8,6 +8,7 @@ class UserAdmin(admin.ModelAdmin):
         'email',
         'username'
     )
+    readonly_fields = ('recipes_count', 'followers_count')
 
 
 admin.site.register(User, UserAdmin)
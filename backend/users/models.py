@@ -1,6 +1,38 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
-from django.db.models import Q
+from django.db.models import (Exists, F, OuterRef, Prefetch, Q, Value,
+                              Window)
+from django.db.models.functions import RowNumber
+
+
+class UserQuerySet(models.QuerySet):
+
+    def with_is_subscribed(self, user):
+        """Annotate whether the user follows each of the users."""
+        if not user.is_authenticated:
+            return self.annotate(is_subscribed=Value(False))
+        return self.annotate(is_subscribed=Exists(Follows.objects.filter(
+            user=user, following=OuterRef('pk'))))
+
+    def with_recipes(self, recipes_limit=None):
+        """Prefetch the latest recipes of each user.
+
+        The recipes_limit cut is done in SQL per author, so memory grows
+        with the limit rather than with the total number of recipes.
+        """
+        recipes = self.model._meta.get_field(
+            'recipes').related_model.objects.all()
+        if recipes_limit is not None:
+            recipes = recipes.annotate(row_number=Window(
+                RowNumber(), partition_by=F('author'),
+                order_by=F('created_at').desc()
+            )).filter(row_number__lte=recipes_limit)
+        return self.prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='latest_recipes'))
+
+
+class FoodgramUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
 
 
 class User(AbstractUser):
@@ -15,6 +47,15 @@ class User(AbstractUser):
                                   verbose_name='Имя')
     last_name = models.CharField(max_length=150, blank=False, null=False,
                                  verbose_name='Фамилия')
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Рецептов')
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Подписчиков')
+    lists_version = models.BigIntegerField(
+        default=0, editable=False,
+        verbose_name='Версия избранного, корзины и подписок')
+
+    objects = FoodgramUserManager()
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -39,6 +80,10 @@ class Follows(models.Model):
         ordering = ('-created_at',)
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = [
+            models.Index(fields=('user', '-created_at', '-id'),
+                         name='follows_user_created_at_id'),
+        ]
 
         constraints = [
             models.UniqueConstraint(